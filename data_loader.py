@@ -1,59 +1,175 @@
 import pandas as pd
-from typing import Dict, Any
+from typing import Dict, Any, List
 import logging
-from database import HealthDatabase
+import os
+from concurrent.futures import ThreadPoolExecutor
+from database import HealthDatabase, SCHEMA, clear_table
+
+try:
+    import pyarrow as pa
+except ImportError:  # optional; bulk loads fall back to registering the DataFrame
+    pa = None
 
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Columns written for each table, in insert order. id and created_at are
+# left to the column defaults.
+_TABLE_COLUMNS = {
+    table: [column for column, _ in SCHEMA[table] if column not in ('id', 'created_at')]
+    for table in ('medications', 'allergies', 'problems', 'procedures', 'results', 'vitals', 'immunizations')
+}
+
+_NUMERIC_COLUMNS = {
+    'height_cm', 'weight_kg', 'bmi', 'systolic_bp', 'diastolic_bp',
+    'heart_rate', 'temperature_c', 'respiratory_rate', 'oxygen_saturation'
+}
+
+# Date columns per table, normalized to datetimes before loading
+_DATE_COLUMNS = {
+    table: [col for col in columns if col.endswith('_date')]
+    for table, columns in _TABLE_COLUMNS.items()
+}
+
+# Parameterized INSERT used by the row-by-row fallback, built once per table
+_INSERT_SQL = {
+    table: f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' for _ in columns)})"
+    for table, columns in _TABLE_COLUMNS.items()
+}
+
+# Rows handed to each executemany call on the fallback path
+_INSERT_BATCH_SIZE = 10000
+
 class DataLoader:
     """Load transformed health data into DuckDB."""
     
     def __init__(self, db_path: str = "health_data.duckdb"):
         self.db = HealthDatabase(db_path)
         self.conn = self.db.get_connection()
+        self._use_bulk = True
+        self._prepared_frames: Dict[str, pd.DataFrame] = {}
     
-    def clean_date_value(self, date_value):
-        """Clean date value - return None for empty strings."""
-        if not date_value or date_value == '' or pd.isna(date_value):
-            return None
-        return date_value
+    def _prepare_frame(self, table: str, df: pd.DataFrame) -> pd.DataFrame:
+        """Reorder a DataFrame to the table's insert columns and normalize values."""
+        columns = _TABLE_COLUMNS[table]
+        date_columns = _DATE_COLUMNS[table]
+        df = df.reindex(columns=columns)
+        
+        # Normalize values once per column instead of once per cell; blank and
+        # unparseable dates/numbers coerce to NaT/NaN, which load as NULL.
+        # Text columns are left as the transformer filled them, so columns the
+        # source never populated load as NULL, as in SimpleDataLoader.
+        for col in columns:
+            if col in date_columns:
+                df[col] = pd.to_datetime(df[col], format='%Y-%m-%d', errors='coerce')
+            elif col in _NUMERIC_COLUMNS:
+                df[col] = pd.to_numeric(df[col], errors='coerce')
+            elif col == 'measurement_time':
+                df[col] = df[col].replace('', None)
+        
+        return df
     
-    def load_medications(self, df: pd.DataFrame) -> int:
-        """Load medications data into database."""
-        if df.empty:
-            logger.info("No medications data to load")
-            return 0
+    def _prepare_frames(self, transformed_data: Dict[str, pd.DataFrame]) -> Dict[str, pd.DataFrame]:
+        """Prepare every non-empty section for loading, one worker thread per table."""
+        sections = {
+            table: df for table, df in transformed_data.items()
+            if table in _TABLE_COLUMNS and not df.empty
+        }
+        if not sections:
+            return {}
+        
+        max_workers = min(len(sections), os.cpu_count() or 1)
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {
+                table: executor.submit(self._prepare_frame, table, df)
+                for table, df in sections.items()
+            }
+            return {table: future.result() for table, future in futures.items()}
+    
+    def _load_table(self, table: str, df: pd.DataFrame) -> int:
+        """Load a DataFrame into a table using the current load strategy."""
+        prepared = self._prepared_frames.get(table)
+        df = prepared if prepared is not None else self._prepare_frame(table, df)
+        
+        if self._use_bulk:
+            return self._bulk_load(table, df)
+        return self._row_load(table, df)
+    
+    def _bulk_load(self, table: str, df: pd.DataFrame) -> int:
+        """Replace the contents of a table with a prepared DataFrame in a single INSERT."""
+        column_list = ', '.join(_TABLE_COLUMNS[table])
+        
+        # Arrow tables are scanned straight from their buffers, without boxing
+        # each string as a Python object; use them when pyarrow is installed.
+        source = pa.Table.from_pandas(df, preserve_index=False) if pa is not None else df
+        
+        self.conn.register('tmp_df', source)
+        try:
+            # The tables carry no indexes or constraints, so a plain DELETE is as
+            # cheap as dropping and recreating them and keeps the declared schema
+            clear_table(self.conn, table)
+            self.conn.execute(f"INSERT INTO {table} ({column_list}) SELECT {column_list} FROM tmp_df")
+        finally:
+            self.conn.unregister('tmp_df')
         
-        # Clear existing data (for full refresh)
-        self.conn.execute("DELETE FROM medications")
+        return len(df)
+    
+    def _row_load(self, table: str, df: pd.DataFrame) -> int:
+        """Replace the contents of a table with parameterized row inserts.
+        
+        Used when the bulk path fails. Each batch is committed on its own; a
+        batch that fails is retried row by row, so only the rows that actually
+        fail are skipped.
+        """
+        sql = _INSERT_SQL[table]
+        
+        # Plain tuples with None for missing values bind directly as parameters
+        df = df.astype(object).where(df.notna(), None)
+        rows = list(df.itertuples(index=False, name=None))
+        
+        self.conn.execute("BEGIN TRANSACTION")
+        try:
+            clear_table(self.conn, table)
+            self.conn.execute("COMMIT")
+        except Exception:
+            self.conn.execute("ROLLBACK")
+            raise
+        
+        records_inserted = 0
+        for start in range(0, len(rows), _INSERT_BATCH_SIZE):
+            batch = rows[start:start + _INSERT_BATCH_SIZE]
+            # executemany prepares the INSERT once per call and binds each row
+            # against it, so there is no per-row parse/plan to cache away
+            self.conn.execute("BEGIN TRANSACTION")
+            try:
+                self.conn.executemany(sql, batch)
+                self.conn.execute("COMMIT")
+                records_inserted += len(batch)
+            except Exception as e:
+                self.conn.execute("ROLLBACK")
+                logger.warning("Batch insert into %s failed, retrying row by row: %s", table, e)
+                records_inserted += self._insert_rows(table, sql, batch)
         
-        # Insert new data
+        return records_inserted
+    
+    def _insert_rows(self, table: str, sql: str, rows: List[tuple]) -> int:
+        """Insert rows one at a time, skipping and logging any that fail."""
         records_inserted = 0
-        for idx, row in df.iterrows():
+        for row in rows:
             try:
-                self.conn.execute("""
-                    INSERT INTO medications (
-                        id, medication_name, dosage, frequency, route, start_date, end_date,
-                        status, prescriber, ndc_code, rxnorm_code, instructions
-                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                """, [
-                    idx + 1,
-                    row.get('medication_name', ''),
-                    row.get('dosage', ''),
-                    row.get('frequency', ''),
-                    row.get('route', ''),
-                    self.clean_date_value(row.get('start_date')),
-                    self.clean_date_value(row.get('end_date')),
-                    row.get('status', ''),
-                    row.get('prescriber', ''),
-                    row.get('ndc_code', ''),
-                    row.get('rxnorm_code', ''),
-                    row.get('instructions', '')
-                ])
+                self.conn.execute(sql, row)
                 records_inserted += 1
             except Exception as e:
-                logger.error(f"Error inserting medication record: {e}")
+                logger.error("Error inserting %s record: %s", table, e)
+        
+        return records_inserted
+    
+    def load_medications(self, df: pd.DataFrame) -> int:
+        """Load medications data into database."""
+        if df.empty:
+            logger.info("No medications data to load")
+            return 0
+        
+        records_inserted = self._load_table('medications', df)
         
         logger.info(f"Loaded {records_inserted} medication records")
         return records_inserted
@@ -64,27 +180,7 @@ class DataLoader:
             logger.info("No allergies data to load")
             return 0
         
-        self.conn.execute("DELETE FROM allergies")
-        
-        records_inserted = 0
-        for _, row in df.iterrows():
-            try:
-                self.conn.execute("""
-                    INSERT INTO allergies (
-                        allergen, reaction, severity, onset_date, status, allergy_code, notes
-                    ) VALUES (?, ?, ?, ?, ?, ?, ?)
-                """, [
-                    row.get('allergen', ''),
-                    row.get('reaction', ''),
-                    row.get('severity', ''),
-                    self.clean_date_value(row.get('onset_date')),
-                    row.get('status', ''),
-                    row.get('allergy_code', ''),
-                    row.get('notes', '')
-                ])
-                records_inserted += 1
-            except Exception as e:
-                logger.error(f"Error inserting allergy record: {e}")
+        records_inserted = self._load_table('allergies', df)
         
         logger.info(f"Loaded {records_inserted} allergy records")
         return records_inserted
@@ -95,29 +191,7 @@ class DataLoader:
             logger.info("No problems data to load")
             return 0
         
-        self.conn.execute("DELETE FROM problems")
-        
-        records_inserted = 0
-        for _, row in df.iterrows():
-            try:
-                self.conn.execute("""
-                    INSERT INTO problems (
-                        problem_name, icd10_code, snomed_code, onset_date, resolution_date,
-                        status, severity, notes
-                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-                """, [
-                    row.get('problem_name', ''),
-                    row.get('icd10_code', ''),
-                    row.get('snomed_code', ''),
-                    self.clean_date_value(row.get('onset_date')),
-                    self.clean_date_value(row.get('resolution_date')),
-                    row.get('status', ''),
-                    row.get('severity', ''),
-                    row.get('notes', '')
-                ])
-                records_inserted += 1
-            except Exception as e:
-                logger.error(f"Error inserting problem record: {e}")
+        records_inserted = self._load_table('problems', df)
         
         logger.info(f"Loaded {records_inserted} problem records")
         return records_inserted
@@ -128,29 +202,7 @@ class DataLoader:
             logger.info("No procedures data to load")
             return 0
         
-        self.conn.execute("DELETE FROM procedures")
-        
-        records_inserted = 0
-        for _, row in df.iterrows():
-            try:
-                self.conn.execute("""
-                    INSERT INTO procedures (
-                        procedure_name, procedure_date, cpt_code, snomed_code, provider,
-                        location, status, notes
-                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-                """, [
-                    row.get('procedure_name', ''),
-                    self.clean_date_value(row.get('procedure_date')),
-                    row.get('cpt_code', ''),
-                    row.get('snomed_code', ''),
-                    row.get('provider', ''),
-                    row.get('location', ''),
-                    row.get('status', ''),
-                    row.get('notes', '')
-                ])
-                records_inserted += 1
-            except Exception as e:
-                logger.error(f"Error inserting procedure record: {e}")
+        records_inserted = self._load_table('procedures', df)
         
         logger.info(f"Loaded {records_inserted} procedure records")
         return records_inserted
@@ -161,31 +213,7 @@ class DataLoader:
             logger.info("No lab results data to load")
             return 0
         
-        self.conn.execute("DELETE FROM results")
-        
-        records_inserted = 0
-        for _, row in df.iterrows():
-            try:
-                self.conn.execute("""
-                    INSERT INTO results (
-                        test_name, test_date, result_value, unit, reference_range,
-                        abnormal_flag, status, loinc_code, provider, notes
-                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                """, [
-                    row.get('test_name', ''),
-                    self.clean_date_value(row.get('test_date')),
-                    row.get('result_value', ''),
-                    row.get('unit', ''),
-                    row.get('reference_range', ''),
-                    row.get('abnormal_flag', ''),
-                    row.get('status', ''),
-                    row.get('loinc_code', ''),
-                    row.get('provider', ''),
-                    row.get('notes', '')
-                ])
-                records_inserted += 1
-            except Exception as e:
-                logger.error(f"Error inserting lab result record: {e}")
+        records_inserted = self._load_table('results', df)
         
         logger.info(f"Loaded {records_inserted} lab result records")
         return records_inserted
@@ -196,34 +224,7 @@ class DataLoader:
             logger.info("No vitals data to load")
             return 0
         
-        self.conn.execute("DELETE FROM vitals")
-        
-        records_inserted = 0
-        for _, row in df.iterrows():
-            try:
-                self.conn.execute("""
-                    INSERT INTO vitals (
-                        measurement_date, measurement_time, height_cm, weight_kg, bmi,
-                        systolic_bp, diastolic_bp, heart_rate, temperature_c,
-                        respiratory_rate, oxygen_saturation, notes
-                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                """, [
-                    self.clean_date_value(row.get('measurement_date')),
-                    row.get('measurement_time', None),
-                    row.get('height_cm', None),
-                    row.get('weight_kg', None),
-                    row.get('bmi', None),
-                    row.get('systolic_bp', None),
-                    row.get('diastolic_bp', None),
-                    row.get('heart_rate', None),
-                    row.get('temperature_c', None),
-                    row.get('respiratory_rate', None),
-                    row.get('oxygen_saturation', None),
-                    row.get('notes', '')
-                ])
-                records_inserted += 1
-            except Exception as e:
-                logger.error(f"Error inserting vitals record: {e}")
+        records_inserted = self._load_table('vitals', df)
         
         logger.info(f"Loaded {records_inserted} vitals records")
         return records_inserted
@@ -234,36 +235,36 @@ class DataLoader:
             logger.info("No immunizations data to load")
             return 0
         
-        self.conn.execute("DELETE FROM immunizations")
-        
-        records_inserted = 0
-        for _, row in df.iterrows():
-            try:
-                self.conn.execute("""
-                    INSERT INTO immunizations (
-                        vaccine_name, administration_date, lot_number, manufacturer,
-                        route, site, cvx_code, provider, notes
-                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-                """, [
-                    row.get('vaccine_name', ''),
-                    self.clean_date_value(row.get('administration_date')),
-                    row.get('lot_number', ''),
-                    row.get('manufacturer', ''),
-                    row.get('route', ''),
-                    row.get('site', ''),
-                    row.get('cvx_code', ''),
-                    row.get('provider', ''),
-                    row.get('notes', '')
-                ])
-                records_inserted += 1
-            except Exception as e:
-                logger.error(f"Error inserting immunization record: {e}")
+        records_inserted = self._load_table('immunizations', df)
         
         logger.info(f"Loaded {records_inserted} immunization records")
         return records_inserted
     
     def load_all_data(self, transformed_data: Dict[str, pd.DataFrame]) -> Dict[str, int]:
-        """Load all transformed data into database."""
+        """Load all transformed data into database in a single transaction."""
+        # Frame preparation is CPU-bound pandas work, so do it for all tables
+        # up front; the inserts themselves stay serial on this connection.
+        self._prepared_frames = self._prepare_frames(transformed_data)
+        try:
+            self.conn.execute("BEGIN TRANSACTION")
+            try:
+                load_results = self._load_sections(transformed_data)
+                self.conn.execute("COMMIT")
+            except Exception as e:
+                self.conn.execute("ROLLBACK")
+                logger.warning(f"Bulk load failed, retrying row by row: {e}")
+                self._use_bulk = False
+                try:
+                    load_results = self._load_sections(transformed_data)
+                finally:
+                    self._use_bulk = True
+        finally:
+            self._prepared_frames = {}
+        
+        return load_results
+    
+    def _load_sections(self, transformed_data: Dict[str, pd.DataFrame]) -> Dict[str, int]:
+        """Load each transformed section into its table."""
         load_results = {}
         
         if 'medications' in transformed_data:
@@ -291,18 +292,17 @@ class DataLoader:
     
     def get_table_counts(self) -> Dict[str, int]:
         """Get record counts for all tables."""
-        tables = ['medications', 'allergies', 'problems', 'procedures', 'results', 'vitals', 'immunizations']
-        counts = {}
+        tables = list(_TABLE_COLUMNS)
         
-        for table in tables:
-            try:
-                result = self.conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()
-                counts[table] = result[0] if result else 0
-            except Exception as e:
-                logger.error(f"Error getting count for {table}: {e}")
-                counts[table] = 0
+        # One statement with a scalar subquery per table instead of one query each
+        query = "SELECT " + ", ".join(f"(SELECT COUNT(*) FROM {table})" for table in tables)
+        try:
+            result = self.conn.execute(query).fetchone()
+        except Exception as e:
+            logger.error(f"Error getting table counts: {e}")
+            return {table: 0 for table in tables}
         
-        return counts
+        return dict(zip(tables, result))
     
     def close(self):
         """Close database connection."""
@@ -1,12 +1,108 @@
+import numpy as np
 import pandas as pd
-from typing import Dict, List, Any, Optional
+from typing import Callable, Dict, List, Any, Optional
 import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 import re
 
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Precompiled patterns shared by the scalar helpers and the column kernels
+_WHITESPACE = re.compile(r'\s+')
+_NUMBER = re.compile(r'(-?\d+(?:\.\d+)?)')
+_NON_NUMERIC = re.compile(r'[^\d.-]')
+_ISO_DATE = re.compile(r'\d{4}-\d{2}-\d{2}')
+_ENTITY = re.compile(r'&(amp|lt|gt|nbsp);')
+_ENTITIES = {'amp': '&', 'lt': '<', 'gt': '>', 'nbsp': ' '}
+
+def _decode_entity(match: re.Match) -> str:
+    return _ENTITIES[match.group(1)]
+
+# Columns each transformed section is built with (table columns minus id/created_at)
+_SECTION_COLUMNS = {
+    'medications': ['medication_name', 'dosage', 'frequency', 'route', 'start_date', 'end_date', 'status', 'prescriber', 'ndc_code', 'rxnorm_code', 'instructions'],
+    'allergies': ['allergen', 'reaction', 'severity', 'onset_date', 'status', 'allergy_code', 'notes'],
+    'problems': ['problem_name', 'icd10_code', 'snomed_code', 'onset_date', 'resolution_date', 'status', 'severity', 'notes'],
+    'procedures': ['procedure_name', 'procedure_date', 'cpt_code', 'snomed_code', 'provider', 'location', 'status', 'notes'],
+    'results': ['test_name', 'test_date', 'result_value', 'unit', 'reference_range', 'abnormal_flag', 'status', 'loinc_code', 'provider', 'notes'],
+    'vitals': ['measurement_date', 'measurement_time', 'height_cm', 'weight_kg', 'bmi', 'systolic_bp', 'diastolic_bp', 'heart_rate', 'temperature_c', 'respiratory_rate', 'oxygen_saturation', 'notes'],
+    'immunizations': ['vaccine_name', 'administration_date', 'lot_number', 'manufacturer', 'route', 'site', 'cvx_code', 'provider', 'notes'],
+}
+
+# (strptime format, full-match regex) pairs tried in order after the ISO check
+_DATE_FORMATS = [
+    ('%Y%m%d', re.compile(r'\d{8}')),
+    ('%m/%d/%Y', re.compile(r'\d{1,2}/\d{1,2}/\d{4}')),
+    ('%m-%d-%Y', re.compile(r'\d{1,2}-\d{1,2}-\d{4}')),
+    ('%Y/%m/%d', re.compile(r'\d{4}/\d{1,2}/\d{1,2}')),
+]
+
+# Dtype for text columns; pandas backs it with Arrow buffers when pyarrow is
+# installed and with Python strings otherwise. The frames stay pandas so the
+# loaders work without pyarrow, while DuckDB still scans Arrow-backed columns
+# without converting each string.
+_TEXT_DTYPE = pd.StringDtype()
+
+def _clean_series(s: pd.Series) -> pd.Series:
+    """Vectorized equivalent of DataTransformer.clean_text for a whole column."""
+    cleaned = s.astype(_TEXT_DTYPE).str.replace(_WHITESPACE, ' ', regex=True)
+    
+    # Entity decoding calls back into Python per match, so skip it when there is nothing to decode
+    if cleaned.str.contains('&', regex=False).any():
+        cleaned = cleaned.str.replace(_ENTITY, _decode_entity, regex=True)
+    cleaned = cleaned.str.strip()
+    return cleaned.mask(cleaned.eq('').fillna(False))
+
+def _std_dates(s: pd.Series) -> pd.Series:
+    """Vectorized equivalent of DataTransformer.standardize_date for a whole column."""
+    values = s.astype('string')
+    out = values.astype(object).where(values.notna() & values.ne(''), None)
+    
+    # Values already in YYYY-MM-DD format are kept as-is
+    pending = (out.notna() & ~values.str.fullmatch(_ISO_DATE).fillna(False)).astype(bool)
+    
+    for pattern, regex in _DATE_FORMATS:
+        candidates = pending & values.str.fullmatch(regex).fillna(False).astype(bool)
+        if not candidates.any():
+            continue
+        parsed = pd.to_datetime(values[candidates], format=pattern, errors='coerce')
+        parsed = parsed[parsed.notna()]
+        out[parsed.index] = parsed.dt.strftime('%Y-%m-%d')
+        pending[parsed.index] = False
+    
+    for value in values[pending].unique():
+        logger.warning("Could not parse date: %s", value)
+    
+    return out
+
+def _numeric_series(s: pd.Series) -> pd.Series:
+    """Vectorized numeric extraction; columns that are already numeric skip the regex pass."""
+    if pd.api.types.is_numeric_dtype(s):
+        return s.astype('float64')
+    
+    return pd.to_numeric(
+        s.astype('string').str.extract(_NUMBER, expand=False),
+        errors='coerce'
+    ).astype('float64')
+
+def _present(df: pd.DataFrame, cols: List[str]) -> List[str]:
+    """Return the subset of cols that exist in df."""
+    return [col for col in cols if col in df.columns]
+
+def _fill_text(df: pd.DataFrame, skip: List[str]) -> pd.DataFrame:
+    """Store text columns as _TEXT_DTYPE and blank out their missing values.
+    
+    Date and numeric columns (skip) keep their nulls, and text columns the
+    source never populated stay null so they still load as NULL.
+    """
+    text_cols = df.columns.difference(skip, sort=False)
+    df = df.astype({col: _TEXT_DTYPE for col in text_cols})
+    populated = [col for col in text_cols if df[col].notna().any()]
+    df[populated] = df[populated].fillna('')
+    return df
+
 class DataTransformer:
     """Transform and clean extracted health data."""
     
@@ -25,10 +121,7 @@ class DataTransformer:
         text = ' '.join(text.split())
         
         # Remove common HTML entities
-        text = text.replace('&amp;', '&')
-        text = text.replace('&lt;', '<')
-        text = text.replace('&gt;', '>')
-        text = text.replace('&nbsp;', ' ')
+        text = _ENTITY.sub(_decode_entity, text)
         
         return text.strip() if text.strip() else None
     
@@ -38,19 +131,12 @@ class DataTransformer:
             return None
         
         # Already in YYYY-MM-DD format
-        if re.match(r'^\d{4}-\d{2}-\d{2}$', date_str):
+        if _ISO_DATE.fullmatch(date_str):
             return date_str
         
         # Handle various other formats
-        date_patterns = [
-            ('%Y%m%d', r'^\d{8}$'),
-            ('%m/%d/%Y', r'^\d{1,2}/\d{1,2}/\d{4}$'),
-            ('%m-%d-%Y', r'^\d{1,2}-\d{1,2}-\d{4}$'),
-            ('%Y/%m/%d', r'^\d{4}/\d{1,2}/\d{1,2}$'),
-        ]
-        
-        for pattern, regex in date_patterns:
-            if re.match(regex, date_str):
+        for pattern, regex in _DATE_FORMATS:
+            if regex.fullmatch(date_str):
                 try:
                     return datetime.strptime(date_str, pattern).strftime('%Y-%m-%d')
                 except ValueError:
@@ -65,7 +151,7 @@ class DataTransformer:
             return None
         
         # Remove non-numeric characters except decimal point and minus
-        numeric_str = re.sub(r'[^\d.-]', '', str(value_str))
+        numeric_str = _NON_NUMERIC.sub('', str(value_str))
         
         try:
             return float(numeric_str) if numeric_str else None
@@ -77,22 +163,18 @@ class DataTransformer:
         if not medications:
             return pd.DataFrame()
         
-        df = pd.DataFrame(medications)
+        df = pd.DataFrame.from_records(medications, columns=_SECTION_COLUMNS['medications'])
         
-        # Clean text fields
+        # Clean text fields and standardize dates
         text_fields = ['medication_name', 'dosage', 'frequency', 'route', 'status', 'prescriber', 'instructions']
-        for field in text_fields:
-            if field in df.columns:
-                df[field] = df[field].apply(self.clean_text)
-        
-        # Standardize dates
         date_fields = ['start_date', 'end_date']
-        for field in date_fields:
-            if field in df.columns:
-                df[field] = df[field].apply(self.standardize_date)
+        df = df.assign(
+            **{field: _clean_series(df[field]) for field in _present(df, text_fields)},
+            **{field: _std_dates(df[field]) for field in _present(df, date_fields)}
+        )
         
-        # Fill missing values
-        df = df.fillna('')
+        # Fill missing text values
+        df = _fill_text(df, date_fields)
         
         logger.info(f"Transformed {len(df)} medication records")
         return df
@@ -102,17 +184,15 @@ class DataTransformer:
         if not allergies:
             return pd.DataFrame()
         
-        df = pd.DataFrame(allergies)
+        df = pd.DataFrame.from_records(allergies, columns=_SECTION_COLUMNS['allergies'])
         
-        # Clean text fields
+        # Clean text fields and standardize dates
         text_fields = ['allergen', 'reaction', 'severity', 'status', 'notes']
-        for field in text_fields:
-            if field in df.columns:
-                df[field] = df[field].apply(self.clean_text)
-        
-        # Standardize dates
-        if 'onset_date' in df.columns:
-            df['onset_date'] = df['onset_date'].apply(self.standardize_date)
+        date_fields = ['onset_date']
+        df = df.assign(
+            **{field: _clean_series(df[field]) for field in _present(df, text_fields)},
+            **{field: _std_dates(df[field]) for field in _present(df, date_fields)}
+        )
         
         # Standardize severity levels
         if 'severity' in df.columns:
@@ -124,7 +204,7 @@ class DataTransformer:
             }
             df['severity'] = df['severity'].str.lower().map(severity_mapping).fillna(df['severity'])
         
-        df = df.fillna('')
+        df = _fill_text(df, date_fields)
         
         logger.info(f"Transformed {len(df)} allergy records")
         return df
@@ -134,21 +214,17 @@ class DataTransformer:
         if not problems:
             return pd.DataFrame()
         
-        df = pd.DataFrame(problems)
+        df = pd.DataFrame.from_records(problems, columns=_SECTION_COLUMNS['problems'])
         
-        # Clean text fields
+        # Clean text fields and standardize dates
         text_fields = ['problem_name', 'severity', 'status', 'notes']
-        for field in text_fields:
-            if field in df.columns:
-                df[field] = df[field].apply(self.clean_text)
-        
-        # Standardize dates
         date_fields = ['onset_date', 'resolution_date']
-        for field in date_fields:
-            if field in df.columns:
-                df[field] = df[field].apply(self.standardize_date)
+        df = df.assign(
+            **{field: _clean_series(df[field]) for field in _present(df, text_fields)},
+            **{field: _std_dates(df[field]) for field in _present(df, date_fields)}
+        )
         
-        df = df.fillna('')
+        df = _fill_text(df, date_fields)
         
         logger.info(f"Transformed {len(df)} problem records")
         return df
@@ -158,19 +234,17 @@ class DataTransformer:
         if not procedures:
             return pd.DataFrame()
         
-        df = pd.DataFrame(procedures)
+        df = pd.DataFrame.from_records(procedures, columns=_SECTION_COLUMNS['procedures'])
         
-        # Clean text fields
+        # Clean text fields and standardize dates
         text_fields = ['procedure_name', 'provider', 'location', 'status', 'notes']
-        for field in text_fields:
-            if field in df.columns:
-                df[field] = df[field].apply(self.clean_text)
+        date_fields = ['procedure_date']
+        df = df.assign(
+            **{field: _clean_series(df[field]) for field in _present(df, text_fields)},
+            **{field: _std_dates(df[field]) for field in _present(df, date_fields)}
+        )
         
-        # Standardize dates
-        if 'procedure_date' in df.columns:
-            df['procedure_date'] = df['procedure_date'].apply(self.standardize_date)
-        
-        df = df.fillna('')
+        df = _fill_text(df, date_fields)
         
         logger.info(f"Transformed {len(df)} procedure records")
         return df
@@ -180,23 +254,17 @@ class DataTransformer:
         if not results:
             return pd.DataFrame()
         
-        df = pd.DataFrame(results)
-        
-        # Clean text fields
-        text_fields = ['test_name', 'unit', 'reference_range', 'abnormal_flag', 'status', 'provider', 'notes']
-        for field in text_fields:
-            if field in df.columns:
-                df[field] = df[field].apply(self.clean_text)
-        
-        # Standardize dates
-        if 'test_date' in df.columns:
-            df['test_date'] = df['test_date'].apply(self.standardize_date)
+        df = pd.DataFrame.from_records(results, columns=_SECTION_COLUMNS['results'])
         
-        # Clean result values
-        if 'result_value' in df.columns:
-            df['result_value'] = df['result_value'].apply(self.clean_text)
+        # Clean text fields (including result values) and standardize dates
+        text_fields = ['test_name', 'result_value', 'unit', 'reference_range', 'abnormal_flag', 'status', 'provider', 'notes']
+        date_fields = ['test_date']
+        df = df.assign(
+            **{field: _clean_series(df[field]) for field in _present(df, text_fields)},
+            **{field: _std_dates(df[field]) for field in _present(df, date_fields)}
+        )
         
-        df = df.fillna('')
+        df = _fill_text(df, date_fields)
         
         logger.info(f"Transformed {len(df)} lab result records")
         return df
@@ -206,38 +274,30 @@ class DataTransformer:
         if not vitals:
             return pd.DataFrame()
         
-        # Group vitals by date to combine measurements from same visit
-        vitals_by_date = {}
-        for vital in vitals:
-            date = vital.get('measurement_date')
-            if date:
-                if date not in vitals_by_date:
-                    vitals_by_date[date] = {'measurement_date': date}
-                vitals_by_date[date].update(vital)
-        
-        df = pd.DataFrame(list(vitals_by_date.values()))
+        df = pd.DataFrame.from_records(vitals, columns=_SECTION_COLUMNS['vitals'])
         
-        # Standardize dates
-        if 'measurement_date' in df.columns:
-            df['measurement_date'] = df['measurement_date'].apply(self.standardize_date)
+        # Group vitals by date to combine measurements from same visit
+        df = df[df['measurement_date'].notna() & df['measurement_date'].ne('')]
+        df = df.groupby('measurement_date', sort=False, as_index=False).last()
         
-        # Convert numeric fields
+        # Standardize dates and convert numeric fields
         numeric_fields = ['height_cm', 'weight_kg', 'bmi', 'systolic_bp', 'diastolic_bp', 
                          'heart_rate', 'temperature_c', 'respiratory_rate', 'oxygen_saturation']
-        
-        for field in numeric_fields:
-            if field in df.columns:
-                df[field] = df[field].apply(self.extract_numeric_value)
-        
-        # Calculate BMI if height and weight are available
-        if 'height_cm' in df.columns and 'weight_kg' in df.columns and 'bmi' not in df.columns:
-            df['bmi'] = df.apply(
-                lambda row: round(row['weight_kg'] / ((row['height_cm']/100) ** 2), 1) 
-                if pd.notna(row['weight_kg']) and pd.notna(row['height_cm']) and row['height_cm'] > 0 
-                else None, axis=1
-            )
-        
-        df = df.fillna('')
+        df = df.assign(
+            measurement_date=_std_dates(df['measurement_date']),
+            **{field: _numeric_series(df[field]) for field in _present(df, numeric_fields)}
+        )
+        
+        # Calculate BMI where it wasn't reported but height and weight are available
+        if 'height_cm' in df.columns and 'weight_kg' in df.columns:
+            h = df['height_cm'].to_numpy(dtype='float64')
+            w = df['weight_kg'].to_numpy(dtype='float64')
+            with np.errstate(divide='ignore', invalid='ignore'):
+                bmi = np.round(w / (h / 100.0) ** 2, 1)
+            bmi[(h <= 0) | ~np.isfinite(bmi)] = np.nan
+            df['bmi'] = df['bmi'].fillna(pd.Series(bmi, index=df.index))
+        
+        df = _fill_text(df, ['measurement_date', 'measurement_time'] + numeric_fields)
         
         logger.info(f"Transformed {len(df)} vital sign records")
         return df
@@ -247,46 +307,48 @@ class DataTransformer:
         if not immunizations:
             return pd.DataFrame()
         
-        df = pd.DataFrame(immunizations)
+        df = pd.DataFrame.from_records(immunizations, columns=_SECTION_COLUMNS['immunizations'])
         
-        # Clean text fields
+        # Clean text fields and standardize dates
         text_fields = ['vaccine_name', 'lot_number', 'manufacturer', 'route', 'site', 'provider', 'notes']
-        for field in text_fields:
-            if field in df.columns:
-                df[field] = df[field].apply(self.clean_text)
-        
-        # Standardize dates
-        if 'administration_date' in df.columns:
-            df['administration_date'] = df['administration_date'].apply(self.standardize_date)
+        date_fields = ['administration_date']
+        df = df.assign(
+            **{field: _clean_series(df[field]) for field in _present(df, text_fields)},
+            **{field: _std_dates(df[field]) for field in _present(df, date_fields)}
+        )
         
-        df = df.fillna('')
+        df = _fill_text(df, date_fields)
         
         logger.info(f"Transformed {len(df)} immunization records")
         return df
     
+    def _section_transforms(self) -> Dict[str, Callable[[List[Dict[str, Any]]], pd.DataFrame]]:
+        """Map each section name to its transform method."""
+        return {
+            'medications': self.transform_medications,
+            'allergies': self.transform_allergies,
+            'problems': self.transform_problems,
+            'procedures': self.transform_procedures,
+            'results': self.transform_results,
+            'vitals': self.transform_vitals,
+            'immunizations': self.transform_immunizations,
+        }
+    
+    def transform_section(self, section: str, records: List[Dict[str, Any]]) -> pd.DataFrame:
+        """Transform the parsed records of a single section."""
+        return self._section_transforms()[section](records)
+    
     def transform_all_data(self, parsed_data: Dict[str, List[Dict[str, Any]]]) -> Dict[str, pd.DataFrame]:
-        """Transform all parsed data sections."""
-        transformed_data = {}
-        
-        if 'medications' in parsed_data:
-            transformed_data['medications'] = self.transform_medications(parsed_data['medications'])
-        
-        if 'allergies' in parsed_data:
-            transformed_data['allergies'] = self.transform_allergies(parsed_data['allergies'])
-        
-        if 'problems' in parsed_data:
-            transformed_data['problems'] = self.transform_problems(parsed_data['problems'])
-        
-        if 'procedures' in parsed_data:
-            transformed_data['procedures'] = self.transform_procedures(parsed_data['procedures'])
-        
-        if 'results' in parsed_data:
-            transformed_data['results'] = self.transform_results(parsed_data['results'])
-        
-        if 'vitals' in parsed_data:
-            transformed_data['vitals'] = self.transform_vitals(parsed_data['vitals'])
-        
-        if 'immunizations' in parsed_data:
-            transformed_data['immunizations'] = self.transform_immunizations(parsed_data['immunizations'])
+        """Transform all parsed data sections, running independent sections concurrently."""
+        transforms = self._section_transforms()
+        
+        max_workers = min(len(transforms), os.cpu_count() or 1)
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {
+                section: executor.submit(transform, parsed_data[section])
+                for section, transform in transforms.items()
+                if section in parsed_data
+            }
+            transformed_data = {section: future.result() for section, future in futures.items()}
         
-        return transformed_data
\ No newline at end of file
+        return transformed_data
@@ -1,218 +1,324 @@
 import duckdb
-from typing import Optional
+from typing import Dict, List, Optional
 import logging
 
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-class HealthDatabase:
-    def __init__(self, db_path: str = "/Users/Shared/health_data.duckdb"):
-        """Initialize the health database connection."""
-        self.db_path = db_path
-        self.conn = duckdb.connect(db_path)
-        self.create_tables()
+# Connection settings for load runs. The WAL is checkpointed in large steps
+# rather than every 16MB.
+_CONNECTION_CONFIG = {
+    'checkpoint_threshold': '1GB'
+}
+
+# Bump whenever SCHEMA changes. Version 4 also re-migrates databases that
+# were stamped 3 without their older tables having been rebuilt.
+_SCHEMA_VERSION = 4
+
+# DuckDB has no PRAGMA user_version, so the schema version is kept as a
+# comment on the last table created
+_VERSION_TABLE = 'care_plans'
+_VERSION_PREFIX = "health-data-loader schema "
+_VERSION_COMMENT = f"{_VERSION_PREFIX}{_SCHEMA_VERSION}"
+
+# Column compression is pinned rather than left to DuckDB's per-segment
+# choice: dictionary for low-cardinality labels and codes, FSST for free
+# text, bitpacking for small integer measurements and RLE for the load
+# timestamp, which is constant within a load.
+#
+# Row ids come from one sequence per table, so loaders never send an id
+# column. There is deliberately no PRIMARY KEY: nothing looks rows up by id,
+# and the index would have to be maintained on every reload. clear_table
+# restarts the sequence along with the DELETE, so reloading the same data
+# gives the same ids.
+SCHEMA = {
+    # Medications table
+    'medications': [
+        ('id', "BIGINT DEFAULT nextval('seq_medications')"),
+        ('medication_name', 'VARCHAR'),
+        ('dosage', 'VARCHAR'),
+        ('frequency', 'VARCHAR USING COMPRESSION dictionary'),
+        ('route', 'VARCHAR USING COMPRESSION dictionary'),
+        ('start_date', 'DATE'),
+        ('end_date', 'DATE'),
+        ('status', 'VARCHAR USING COMPRESSION dictionary'),
+        ('prescriber', 'VARCHAR'),
+        ('ndc_code', 'VARCHAR USING COMPRESSION dictionary'),
+        ('rxnorm_code', 'VARCHAR USING COMPRESSION dictionary'),
+        ('instructions', 'TEXT USING COMPRESSION fsst'),
+        ('created_at', 'TIMESTAMP DEFAULT CURRENT_TIMESTAMP USING COMPRESSION rle')
+    ],
+
+    # Allergies table
+    'allergies': [
+        ('id', "BIGINT DEFAULT nextval('seq_allergies')"),
+        ('allergen', 'VARCHAR'),
+        ('reaction', 'VARCHAR'),
+        ('severity', 'VARCHAR USING COMPRESSION dictionary'),
+        ('onset_date', 'DATE'),
+        ('status', 'VARCHAR USING COMPRESSION dictionary'),
+        ('allergy_code', 'VARCHAR USING COMPRESSION dictionary'),
+        ('notes', 'TEXT USING COMPRESSION fsst'),
+        ('created_at', 'TIMESTAMP DEFAULT CURRENT_TIMESTAMP USING COMPRESSION rle')
+    ],
+
+    # Problems/Diagnoses table
+    'problems': [
+        ('id', "BIGINT DEFAULT nextval('seq_problems')"),
+        ('problem_name', 'VARCHAR'),
+        ('icd10_code', 'VARCHAR USING COMPRESSION dictionary'),
+        ('snomed_code', 'VARCHAR USING COMPRESSION dictionary'),
+        ('onset_date', 'DATE'),
+        ('resolution_date', 'DATE'),
+        ('status', 'VARCHAR USING COMPRESSION dictionary'),
+        ('severity', 'VARCHAR USING COMPRESSION dictionary'),
+        ('notes', 'TEXT USING COMPRESSION fsst'),
+        ('created_at', 'TIMESTAMP DEFAULT CURRENT_TIMESTAMP USING COMPRESSION rle')
+    ],
+
+    # Procedures table
+    'procedures': [
+        ('id', "BIGINT DEFAULT nextval('seq_procedures')"),
+        ('procedure_name', 'VARCHAR'),
+        ('procedure_date', 'DATE'),
+        ('cpt_code', 'VARCHAR USING COMPRESSION dictionary'),
+        ('snomed_code', 'VARCHAR USING COMPRESSION dictionary'),
+        ('provider', 'VARCHAR'),
+        ('location', 'VARCHAR'),
+        ('status', 'VARCHAR USING COMPRESSION dictionary'),
+        ('notes', 'TEXT USING COMPRESSION fsst'),
+        ('created_at', 'TIMESTAMP DEFAULT CURRENT_TIMESTAMP USING COMPRESSION rle')
+    ],
+
+    # Lab Results table
+    'results': [
+        ('id', "BIGINT DEFAULT nextval('seq_results')"),
+        ('test_name', 'VARCHAR'),
+        ('test_date', 'DATE'),
+        ('result_value', 'VARCHAR'),
+        ('unit', 'VARCHAR USING COMPRESSION dictionary'),
+        ('reference_range', 'VARCHAR'),
+        ('abnormal_flag', 'VARCHAR USING COMPRESSION dictionary'),
+        ('status', 'VARCHAR USING COMPRESSION dictionary'),
+        ('loinc_code', 'VARCHAR USING COMPRESSION dictionary'),
+        ('provider', 'VARCHAR'),
+        ('notes', 'TEXT USING COMPRESSION fsst'),
+        ('created_at', 'TIMESTAMP DEFAULT CURRENT_TIMESTAMP USING COMPRESSION rle')
+    ],
+
+    # Vitals table
+    'vitals': [
+        ('id', "BIGINT DEFAULT nextval('seq_vitals')"),
+        ('measurement_date', 'DATE'),
+        ('measurement_time', 'TIME'),
+        ('height_cm', 'DECIMAL(8,2)'),
+        ('weight_kg', 'DECIMAL(8,2)'),
+        ('bmi', 'DECIMAL(8,2)'),
+        ('systolic_bp', 'INTEGER USING COMPRESSION bitpacking'),
+        ('diastolic_bp', 'INTEGER USING COMPRESSION bitpacking'),
+        ('heart_rate', 'INTEGER USING COMPRESSION bitpacking'),
+        ('temperature_c', 'DECIMAL(4,1)'),
+        ('respiratory_rate', 'INTEGER USING COMPRESSION bitpacking'),
+        ('oxygen_saturation', 'DECIMAL(5,2)'),
+        ('notes', 'TEXT USING COMPRESSION fsst'),
+        ('created_at', 'TIMESTAMP DEFAULT CURRENT_TIMESTAMP USING COMPRESSION rle')
+    ],
+
+    # Immunizations table
+    'immunizations': [
+        ('id', "BIGINT DEFAULT nextval('seq_immunizations')"),
+        ('vaccine_name', 'VARCHAR'),
+        ('administration_date', 'DATE'),
+        ('lot_number', 'VARCHAR'),
+        ('manufacturer', 'VARCHAR'),
+        ('route', 'VARCHAR USING COMPRESSION dictionary'),
+        ('site', 'VARCHAR'),
+        ('cvx_code', 'VARCHAR USING COMPRESSION dictionary'),
+        ('provider', 'VARCHAR'),
+        ('notes', 'TEXT USING COMPRESSION fsst'),
+        ('created_at', 'TIMESTAMP DEFAULT CURRENT_TIMESTAMP USING COMPRESSION rle')
+    ],
+
+    # Encounters table
+    'encounters': [
+        ('id', "BIGINT DEFAULT nextval('seq_encounters')"),
+        ('encounter_date', 'DATE'),
+        ('encounter_time', 'TIME'),
+        ('encounter_type', 'VARCHAR USING COMPRESSION dictionary'),
+        ('provider', 'VARCHAR'),
+        ('facility', 'VARCHAR'),
+        ('department', 'VARCHAR'),
+        ('chief_complaint', 'TEXT USING COMPRESSION fsst'),
+        ('diagnosis', 'TEXT USING COMPRESSION fsst'),
+        ('notes', 'TEXT USING COMPRESSION fsst'),
+        ('created_at', 'TIMESTAMP DEFAULT CURRENT_TIMESTAMP USING COMPRESSION rle')
+    ],
+
+    # Social History table
+    'social_history': [
+        ('id', "BIGINT DEFAULT nextval('seq_social_history')"),
+        ('category', 'VARCHAR USING COMPRESSION dictionary'),
+        ('description', 'TEXT USING COMPRESSION fsst'),
+        ('status', 'VARCHAR USING COMPRESSION dictionary'),
+        ('start_date', 'DATE'),
+        ('end_date', 'DATE'),
+        ('quantity', 'VARCHAR'),
+        ('frequency', 'VARCHAR USING COMPRESSION dictionary'),
+        ('notes', 'TEXT USING COMPRESSION fsst'),
+        ('created_at', 'TIMESTAMP DEFAULT CURRENT_TIMESTAMP USING COMPRESSION rle')
+    ],
+
+    # Family History table
+    'family_history': [
+        ('id', "BIGINT DEFAULT nextval('seq_family_history')"),
+        ('relationship', 'VARCHAR USING COMPRESSION dictionary'),
+        ('condition', 'VARCHAR'),
+        ('age_at_diagnosis', 'INTEGER USING COMPRESSION bitpacking'),
+        ('icd10_code', 'VARCHAR USING COMPRESSION dictionary'),
+        ('snomed_code', 'VARCHAR USING COMPRESSION dictionary'),
+        ('status', 'VARCHAR USING COMPRESSION dictionary'),
+        ('notes', 'TEXT USING COMPRESSION fsst'),
+        ('created_at', 'TIMESTAMP DEFAULT CURRENT_TIMESTAMP USING COMPRESSION rle')
+    ],
+
+    # Medical History table
+    'medical_history': [
+        ('id', "BIGINT DEFAULT nextval('seq_medical_history')"),
+        ('condition', 'VARCHAR'),
+        ('onset_date', 'DATE'),
+        ('resolution_date', 'DATE'),
+        ('icd10_code', 'VARCHAR USING COMPRESSION dictionary'),
+        ('snomed_code', 'VARCHAR USING COMPRESSION dictionary'),
+        ('status', 'VARCHAR USING COMPRESSION dictionary'),
+        ('severity', 'VARCHAR USING COMPRESSION dictionary'),
+        ('notes', 'TEXT USING COMPRESSION fsst'),
+        ('created_at', 'TIMESTAMP DEFAULT CURRENT_TIMESTAMP USING COMPRESSION rle')
+    ],
+
+    # Care Plans/Goals table
+    'care_plans': [
+        ('id', "BIGINT DEFAULT nextval('seq_care_plans')"),
+        ('goal_description', 'TEXT USING COMPRESSION fsst'),
+        ('target_date', 'DATE'),
+        ('status', 'VARCHAR USING COMPRESSION dictionary'),
+        ('priority', 'VARCHAR USING COMPRESSION dictionary'),
+        ('notes', 'TEXT USING COMPRESSION fsst'),
+        ('created_at', 'TIMESTAMP DEFAULT CURRENT_TIMESTAMP USING COMPRESSION rle')
+    ]
+}
+
+_SEQUENCE_DDL = tuple(f"CREATE SEQUENCE IF NOT EXISTS seq_{table}" for table in SCHEMA)
+
+_TABLE_DDL = tuple(
+    f"CREATE TABLE IF NOT EXISTS {table} ({', '.join(f'{column} {decl}' for column, decl in columns)})"
+    for table, columns in SCHEMA.items()
+)
+
+def clear_table(conn, table: str):
+    """Delete every row of a table and restart its id sequence at 1.
     
-    def create_tables(self):
-        """Create all health data tables."""
-        
-        # Medications table
-        self.conn.execute("""
-            CREATE TABLE IF NOT EXISTS medications (
-                id INTEGER,
-                medication_name VARCHAR,
-                dosage VARCHAR,
-                frequency VARCHAR,
-                route VARCHAR,
-                start_date DATE,
-                end_date DATE,
-                status VARCHAR,
-                prescriber VARCHAR,
-                ndc_code VARCHAR,
-                rxnorm_code VARCHAR,
-                instructions TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
-        
-        # Allergies table
-        self.conn.execute("""
-            CREATE TABLE IF NOT EXISTS allergies (
-                id INTEGER,
-                allergen VARCHAR,
-                reaction VARCHAR,
-                severity VARCHAR,
-                onset_date DATE,
-                status VARCHAR,
-                allergy_code VARCHAR,
-                notes TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
-        
-        # Problems/Diagnoses table
-        self.conn.execute("""
-            CREATE TABLE IF NOT EXISTS problems (
-                id INTEGER,
-                problem_name VARCHAR,
-                icd10_code VARCHAR,
-                snomed_code VARCHAR,
-                onset_date DATE,
-                resolution_date DATE,
-                status VARCHAR,
-                severity VARCHAR,
-                notes TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
-        
-        # Procedures table
-        self.conn.execute("""
-            CREATE TABLE IF NOT EXISTS procedures (
-                id INTEGER,
-                procedure_name VARCHAR,
-                procedure_date DATE,
-                cpt_code VARCHAR,
-                snomed_code VARCHAR,
-                provider VARCHAR,
-                location VARCHAR,
-                status VARCHAR,
-                notes TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
+    DuckDB cannot restart a sequence in place, so it is recreated while the
+    id column's default is detached. Run it inside a transaction so the
+    DELETE and the restart commit together.
+    """
+    conn.execute(f"DELETE FROM {table}")
+    conn.execute(f"ALTER TABLE {table} ALTER COLUMN id DROP DEFAULT")
+    conn.execute(f"DROP SEQUENCE seq_{table}")
+    conn.execute(f"CREATE SEQUENCE seq_{table}")
+    conn.execute(f"ALTER TABLE {table} ALTER COLUMN id SET DEFAULT nextval('seq_{table}')")
+
+class HealthDatabase:
+    def __init__(self, db_path: str = "/Users/Shared/health_data.duckdb", threads: Optional[int] = None,
+                 memory_limit: Optional[str] = None):
+        """Initialize the health database connection.
         
-        # Lab Results table
-        self.conn.execute("""
-            CREATE TABLE IF NOT EXISTS results (
-                id INTEGER,
-                test_name VARCHAR,
-                test_date DATE,
-                result_value VARCHAR,
-                unit VARCHAR,
-                reference_range VARCHAR,
-                abnormal_flag VARCHAR,
-                status VARCHAR,
-                loinc_code VARCHAR,
-                provider VARCHAR,
-                notes TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
+        threads caps DuckDB's worker threads; by default it uses every core.
+        memory_limit (e.g. '4GB') caps DuckDB's memory; by default DuckDB
+        allows 80% of RAM.
+        """
+        self.db_path = db_path
         
-        # Vitals table
-        self.conn.execute("""
-            CREATE TABLE IF NOT EXISTS vitals (
-                id INTEGER,
-                measurement_date DATE,
-                measurement_time TIME,
-                height_cm DECIMAL(8,2),
-                weight_kg DECIMAL(8,2),
-                bmi DECIMAL(8,2),
-                systolic_bp INTEGER,
-                diastolic_bp INTEGER,
-                heart_rate INTEGER,
-                temperature_c DECIMAL(4,1),
-                respiratory_rate INTEGER,
-                oxygen_saturation DECIMAL(5,2),
-                notes TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
+        config = dict(_CONNECTION_CONFIG)
+        if threads:
+            config['threads'] = threads
+        if memory_limit:
+            config['memory_limit'] = memory_limit
+        # Spill next to this database, so separate databases and processes
+        # never share a scratch directory
+        if db_path != ':memory:':
+            config['temp_directory'] = f"{db_path}.tmp"
+        self.conn = duckdb.connect(db_path, config=config)
         
-        # Immunizations table
-        self.conn.execute("""
-            CREATE TABLE IF NOT EXISTS immunizations (
-                id INTEGER,
-                vaccine_name VARCHAR,
-                administration_date DATE,
-                lot_number VARCHAR,
-                manufacturer VARCHAR,
-                route VARCHAR,
-                site VARCHAR,
-                cvx_code VARCHAR,
-                provider VARCHAR,
-                notes TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
+        # Steady-state runs open an existing database; skip the DDL then
+        if self.schema_version() != _SCHEMA_VERSION:
+            self.create_tables()
+    
+    def schema_version(self) -> Optional[int]:
+        """Return the schema version recorded in the database, if any."""
+        row = self.conn.execute(
+            "SELECT comment FROM duckdb_tables() WHERE schema_name = 'main' AND table_name = ?",
+            [_VERSION_TABLE]
+        ).fetchone()
+        if row and row[0] and row[0].startswith(_VERSION_PREFIX):
+            version = row[0][len(_VERSION_PREFIX):]
+            if version.isdigit():
+                return int(version)
+        return None
+    
+    def _table_columns(self) -> Dict[str, List[str]]:
+        """Return the columns of each existing health data table."""
+        rows = self.conn.execute(
+            "SELECT table_name, column_name FROM duckdb_columns() WHERE schema_name = 'main' "
+            "ORDER BY table_name, column_index"
+        ).fetchall()
         
-        # Encounters table
-        self.conn.execute("""
-            CREATE TABLE IF NOT EXISTS encounters (
-                id INTEGER,
-                encounter_date DATE,
-                encounter_time TIME,
-                encounter_type VARCHAR,
-                provider VARCHAR,
-                facility VARCHAR,
-                department VARCHAR,
-                chief_complaint TEXT,
-                diagnosis TEXT,
-                notes TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
+        columns = {}
+        for table, column in rows:
+            if table in SCHEMA:
+                columns.setdefault(table, []).append(column)
+        return columns
+    
+    def _rebuild_table(self, table: str, ddl: str, old_columns: List[str]):
+        """Recreate a table left by an older schema, copying its rows across.
         
-        # Social History table
-        self.conn.execute("""
-            CREATE TABLE IF NOT EXISTS social_history (
-                id INTEGER,
-                category VARCHAR,
-                description TEXT,
-                status VARCHAR,
-                start_date DATE,
-                end_date DATE,
-                quantity VARCHAR,
-                frequency VARCHAR,
-                notes TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
+        Rows get fresh ids from the table's sequence; columns the old table
+        lacks are left to their defaults.
+        """
+        copied = ', '.join(column for column, _ in SCHEMA[table] if column != 'id' and column in old_columns)
         
-        # Family History table
-        self.conn.execute("""
-            CREATE TABLE IF NOT EXISTS family_history (
-                id INTEGER,
-                relationship VARCHAR,
-                condition VARCHAR,
-                age_at_diagnosis INTEGER,
-                icd10_code VARCHAR,
-                snomed_code VARCHAR,
-                status VARCHAR,
-                notes TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
+        self.conn.execute(f"ALTER TABLE {table} RENAME TO {table}_old")
+        self.conn.execute(ddl)
+        if copied:
+            self.conn.execute(f"INSERT INTO {table} ({copied}) SELECT {copied} FROM {table}_old")
+        self.conn.execute(f"DROP TABLE {table}_old")
+    
+    def create_tables(self):
+        """Create all health data tables, migrating any left by an older schema.
         
-        # Medical History table
-        self.conn.execute("""
-            CREATE TABLE IF NOT EXISTS medical_history (
-                id INTEGER,
-                condition VARCHAR,
-                onset_date DATE,
-                resolution_date DATE,
-                icd10_code VARCHAR,
-                snomed_code VARCHAR,
-                status VARCHAR,
-                severity VARCHAR,
-                notes TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
+        CREATE TABLE IF NOT EXISTS leaves existing tables as they are, so tables
+        from an unversioned or older database are rebuilt with the current
+        definitions before the version is recorded.
+        """
+        existing = {} if self.schema_version() == _SCHEMA_VERSION else self._table_columns()
         
-        # Care Plans/Goals table
-        self.conn.execute("""
-            CREATE TABLE IF NOT EXISTS care_plans (
-                id INTEGER,
-                goal_description TEXT,
-                target_date DATE,
-                status VARCHAR,
-                priority VARCHAR,
-                notes TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
+        self.conn.execute("BEGIN TRANSACTION")
+        try:
+            for ddl in _SEQUENCE_DDL:
+                self.conn.execute(ddl)
+            
+            for table, ddl in zip(SCHEMA, _TABLE_DDL):
+                if table in existing:
+                    self._rebuild_table(table, ddl, existing[table])
+                else:
+                    self.conn.execute(ddl)
+            
+            self.conn.execute(f"COMMENT ON TABLE {_VERSION_TABLE} IS '{_VERSION_COMMENT}'")
+            self.conn.execute("COMMIT")
+        except Exception:
+            self.conn.execute("ROLLBACK")
+            raise
         
+        if existing:
+            logger.info(f"Migrated {len(existing)} tables to schema version {_SCHEMA_VERSION}")
         logger.info("Database tables created successfully")
     
     def close(self):
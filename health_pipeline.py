@@ -2,50 +2,75 @@
 
 import argparse
 import logging
+import logging.handlers
+import queue
 import sys
 import os
+import threading
 from datetime import datetime
+from typing import Optional, TYPE_CHECKING
 
-from xml_parser import CCDAParser
-from data_transformers import DataTransformer
-from simple_loader import SimpleDataLoader
+# The pipeline modules pull in lxml, pandas and duckdb; they are imported
+# where first needed so --help and argument errors return immediately
+if TYPE_CHECKING:
+    from database import HealthDatabase
+    from simple_loader import SimpleDataLoader
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.StreamHandler(sys.stdout),
-        logging.FileHandler('health_pipeline.log')
-    ]
-)
 logger = logging.getLogger(__name__)
 
+# Parsed sections allowed to wait for the transform/load consumer
+_SECTION_QUEUE_SIZE = 2
+
+# How often a blocked producer checks whether the consumer has stopped
+_PRODUCER_POLL_SECONDS = 0.1
+
 class HealthDataPipeline:
     """Main health data processing pipeline."""
     
-    def __init__(self, xml_file_path: str, db_path: str = "/Users/Shared/health_data.duckdb"):
+    def __init__(self, xml_file_path: str, db_path: str = "/Users/Shared/health_data.duckdb",
+                 threads: Optional[int] = None, db: Optional['HealthDatabase'] = None,
+                 memory_limit: Optional[str] = None):
         self.xml_file_path = xml_file_path
         self.db_path = db_path
+        self.threads = threads
+        self.memory_limit = memory_limit
         
-        # Initialize components
+        # Initialize components; one database connection is shared by the
+        # loader and the summary and opened on first use
+        self.db = db
         self.parser = None
-        self.transformer = DataTransformer()
+        self.transformer = None
         self.loader = None
+        self._last_counts = None
+    
+    def _get_loader(self) -> 'SimpleDataLoader':
+        """Return the loader, opening the shared database connection if needed."""
+        from database import HealthDatabase
+        from simple_loader import SimpleDataLoader
+        
+        if self.loader is None:
+            if self.db is None:
+                self.db = HealthDatabase(self.db_path, threads=self.threads, memory_limit=self.memory_limit)
+            self.loader = SimpleDataLoader(self.db_path, conn=self.db.get_connection())
+        return self.loader
     
     def validate_input_file(self) -> bool:
         """Validate that the input XML file exists and is readable."""
-        if not os.path.exists(self.xml_file_path):
+        # One stat call gives existence and size
+        try:
+            st = os.stat(self.xml_file_path)
+        except FileNotFoundError:
             logger.error(f"XML file not found: {self.xml_file_path}")
             return False
         
+        # Permission bits say whether anyone may read the file; access()
+        # checks this process
         if not os.access(self.xml_file_path, os.R_OK):
             logger.error(f"Cannot read XML file: {self.xml_file_path}")
             return False
         
         # Check file size
-        file_size = os.path.getsize(self.xml_file_path)
-        logger.info(f"Input file size: {file_size:,} bytes")
+        logger.info(f"Input file size: {st.st_size:,} bytes")
         
         return True
     
@@ -60,27 +85,51 @@ class HealthDataPipeline:
             if not self.validate_input_file():
                 return False
             
-            # Step 2: Parse XML
-            logger.info("Step 1: Parsing XML document...")
-            self.parser = CCDAParser(self.xml_file_path)
-            parsed_data = self.parser.parse_all_sections()
+            from xml_parser import CCDAParser, SECTIONS
+            from data_transformers import DataTransformer
             
-            # Log parsing results
-            for section, data in parsed_data.items():
-                logger.info(f"Parsed {len(data)} records from {section} section")
+            # Step 2: Parse, transform and load each section as it is streamed
+            logger.info("Step 1: Parsing, transforming and loading sections...")
+            self.parser = CCDAParser(self.xml_file_path, load_tree=False)
+            if self.transformer is None:
+                self.transformer = DataTransformer()
+            loader = self._get_loader()
             
-            # Step 3: Transform data
-            logger.info("Step 2: Transforming data...")
-            transformed_data = self.transformer.transform_all_data(parsed_data)
+            sections = queue.Queue(maxsize=_SECTION_QUEUE_SIZE)
+            stop = threading.Event()
+            producer = threading.Thread(target=self._produce_sections, args=(sections, stop), daemon=True)
+            producer.start()
             
-            # Log transformation results
-            for section, df in transformed_data.items():
-                logger.info(f"Transformed {len(df)} {section} records")
+            # All sections commit together; any failure leaves the database as it was
+            load_results = {}
+            try:
+                with loader.transaction():
+                    while True:
+                        item = sections.get()
+                        if item is None:
+                            break
+                        if isinstance(item, Exception):
+                            raise item
+                        
+                        section, records = item
+                        logger.info(f"Parsed {len(records)} records from {section} section")
+                        df = self.transformer.transform_section(section, records)
+                        logger.info(f"Transformed {len(df)} {section} records")
+                        load_results[section] = loader.load_section(section, df)
+            finally:
+                # If loading failed the producer may be blocked on a full
+                # queue; stop it and empty the queue so it can exit and close
+                # the document
+                stop.set()
+                while producer.is_alive():
+                    try:
+                        sections.get(timeout=_PRODUCER_POLL_SECONDS)
+                    except queue.Empty:
+                        pass
+                producer.join()
             
-            # Step 4: Load into database
-            logger.info("Step 3: Loading data into database...")
-            self.loader = SimpleDataLoader(self.db_path)
-            load_results = self.loader.load_all_data(transformed_data)
+            # Sections missing from the document load nothing
+            load_results = {section: load_results.get(section, 0) for section in SECTIONS}
             
             # Log loading results
             total_records = 0
@@ -90,9 +139,10 @@ class HealthDataPipeline:
             
             logger.info(f"Pipeline completed successfully! Total records loaded: {total_records}")
             
-            # Step 5: Verify data in database
-            logger.info("Step 4: Verifying data in database...")
-            table_counts = self.loader.get_table_counts()
+            # Step 3: Verify data in database
+            logger.info("Step 2: Verifying data in database...")
+            table_counts = loader.get_table_counts()
+            self._last_counts = table_counts
             
             logger.info("Final database record counts:")
             for table, count in table_counts.items():
@@ -103,18 +153,76 @@ class HealthDataPipeline:
         except Exception as e:
             logger.error(f"Pipeline failed with error: {e}")
             return False
+    
+    def _produce_sections(self, sections: queue.Queue, stop: threading.Event):
+        """Stream the document and queue each section's records once it is complete.
+        
+        Stops early, closing the document, once stop is set.
+        """
+        def put(item) -> bool:
+            # Wait for room in the queue, giving up once the consumer has stopped
+            while not stop.is_set():
+                try:
+                    sections.put(item, timeout=_PRODUCER_POLL_SECONDS)
+                    return True
+                except queue.Full:
+                    pass
+            return False
         
+        stream = self.parser.stream()
+        try:
+            current, records = None, []
+            for section, record in stream:
+                if section != current:
+                    if current is not None and not put((current, records)):
+                        return
+                    current, records = section, []
+                records.append(record)
+            
+            if current is not None:
+                put((current, records))
+        except Exception as e:
+            put(e)
         finally:
-            # Clean up resources
-            if self.loader:
-                self.loader.close()
+            stream.close()
+            put(None)
     
     def get_database_summary(self) -> dict:
         """Get a summary of the data in the database."""
-        if not self.loader:
-            self.loader = SimpleDataLoader(self.db_path)
+        # DuckDB locks the file while our connection is open, so counts taken
+        # after the last load stay valid until close()
+        if self._last_counts is not None:
+            return self._last_counts
         
-        return self.loader.get_table_counts()
+        return self._get_loader().get_table_counts()
+    
+    def close(self):
+        """Close the shared database connection."""
+        if self.db:
+            self.db.close()
+            self.db = None
+            self.loader = None
+            self._last_counts = None
+
+def _start_logging(level: str) -> logging.handlers.QueueListener:
+    """Configure logging and start the listener that writes it out.
+    
+    Records are only queued on the calling thread; the returned listener writes
+    them to stdout and the log file, and must be stopped to flush them.
+    """
+    log_queue = queue.Queue(-1)
+    log_listener = logging.handlers.QueueListener(
+        log_queue,
+        logging.StreamHandler(sys.stdout),
+        logging.FileHandler('health_pipeline.log')
+    )
+    log_listener.start()
+    logging.basicConfig(
+        level=getattr(logging, level),
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        handlers=[logging.handlers.QueueHandler(log_queue)]
+    )
+    return log_listener
 
 def main():
     """Main entry point for the health data pipeline."""
@@ -140,6 +248,21 @@ def main():
         help='Set logging level (default: INFO)'
     )
     
+    parser.add_argument(
+        '--threads',
+        '-t',
+        type=int,
+        default=None,
+        help='Number of DuckDB worker threads (default: all cores)'
+    )
+    
+    parser.add_argument(
+        '--memory-limit',
+        '-m',
+        default=None,
+        help="DuckDB memory limit, e.g. '4GB' (default: 80%% of RAM)"
+    )
+    
     parser.add_argument(
         '--summary',
         '-s',
@@ -149,26 +272,35 @@ def main():
     
     args = parser.parse_args()
     
-    # Set logging level
-    logging.getLogger().setLevel(getattr(logging, args.log_level))
-    
-    # Create and run pipeline
-    pipeline = HealthDataPipeline(args.xml_file, args.database)
-    
-    start_time = datetime.now()
-    success = pipeline.run()
-    end_time = datetime.now()
+    log_listener = _start_logging(args.log_level)
     
-    # Show execution time
-    duration = end_time - start_time
-    logger.info(f"Pipeline execution time: {duration}")
+    summary = None
+    try:
+        # Create and run pipeline
+        pipeline = HealthDataPipeline(args.xml_file, args.database, threads=args.threads,
+                                      memory_limit=args.memory_limit)
+        
+        start_time = datetime.now()
+        success = pipeline.run()
+        end_time = datetime.now()
+        
+        # Show execution time
+        duration = end_time - start_time
+        logger.info(f"Pipeline execution time: {duration}")
+        
+        if args.summary and success:
+            summary = pipeline.get_database_summary()
+        
+        pipeline.close()
+    finally:
+        # Write out queued log lines before anything else is printed
+        log_listener.stop()
     
     # Show summary if requested
-    if args.summary and success:
+    if summary is not None:
         print("\n" + "="*50)
         print("DATABASE SUMMARY")
         print("="*50)
-        summary = pipeline.get_database_summary()
         for table, count in summary.items():
             print(f"{table.capitalize()}: {count:,} records")
         print("="*50)
@@ -5,59 +5,281 @@ This module contains specialized query functions for health data analysis.
 It provides domain-specific logic for medical data interpretation and formatting.
 """
 
+import asyncio
+import bisect
 import json
 import logging
-from datetime import datetime, date, timedelta
+import math
+import re
+from datetime import datetime, date, time
+from decimal import Decimal
+from contextlib import asynccontextmanager
+from functools import lru_cache, partial
 from typing import Any, Dict, List, Optional, Union, Tuple
 
+try:
+    import orjson
+except ImportError:  # optional; responses fall back to the stdlib encoder
+    orjson = None
+
 logger = logging.getLogger(__name__)
 
+def _json_default(obj: Any) -> Any:
+    """Convert values neither JSON encoder handles natively (DECIMAL columns, dates)."""
+    if isinstance(obj, Decimal):
+        return float(obj)
+    if isinstance(obj, (datetime, date, time)):
+        return obj.isoformat()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+def to_json(obj: Any) -> str:
+    """Serialize a response payload as compact JSON, using orjson when installed."""
+    # Responses are encoded whole: every caller hands the text to the MCP
+    # server as one TextContent string, so a chunked encoder would be joined
+    # back together before anything is sent. Clients parse the text rather
+    # than read it, so it is not indented.
+    if orjson is not None:
+        # Grouping dicts can be keyed by NULL or numbers; json.dumps stringifies
+        # those keys, and orjson only does with OPT_NON_STR_KEYS
+        return orjson.dumps(obj, default=_json_default, option=orjson.OPT_NON_STR_KEYS).decode()
+    return json.dumps(obj, separators=(",", ":"), default=_json_default)
+
+# Condition names containing any of these keywords count as chronic; one
+# case-insensitive pattern scans each name once
+_CHRONIC_KEYWORDS = (
+    "diabetes", "hypertension", "asthma", "copd", "arthritis",
+    "depression", "anxiety", "chronic", "syndrome"
+)
+_CHRONIC_CONDITION = re.compile("|".join(map(re.escape, _CHRONIC_KEYWORDS)), re.IGNORECASE)
+
+# Category lookup tables: a value below limits[i] (and not below an earlier
+# limit) falls in categories[i]
+_BMI_LIMITS = (18.5, 25, 30)
+_BMI_CATEGORIES = ("Underweight", "Normal weight", "Overweight", "Obese")
+
+# Diastolic readings have no separate Elevated band, so 80 appears twice
+_SYSTOLIC_LIMITS = (120, 130, 140, 180)
+_DIASTOLIC_LIMITS = (80, 80, 90, 120)
+_BP_CATEGORIES = ("Normal", "Elevated", "Stage 1 Hypertension",
+                  "Stage 2 Hypertension", "Hypertensive Crisis")
+
+def date_conditions(column: str, has_from: bool, has_to: bool) -> List[str]:
+    """SQL conditions for an optional inclusive date range on column, bound in from, to order."""
+    conditions = []
+    if has_from:
+        conditions.append(f"{column} >= ?")
+    if has_to:
+        conditions.append(f"{column} <= ?")
+    return conditions
+
+def date_params(date_from: Optional[Union[str, date]], date_to: Optional[Union[str, date]]) -> List[date]:
+    """Parse the date range bounds that are set, in the order date_conditions binds them.
+    
+    Bounds are bound as DATE values, so a malformed date fails here rather
+    than inside the query.
+    """
+    return [
+        value if isinstance(value, date) else date.fromisoformat(value)
+        for value in (date_from, date_to) if value
+    ]
+
+# The query endpoints only vary by which optional filters are present, so
+# each endpoint's SQL is built once per filter combination and reused.
+# (DuckDB's Python API has no reusable prepared-statement handle; parameters
+# are still bound per call.)
+
+@lru_cache(maxsize=32)
+def _lab_results_sql(by_name: bool, has_from: bool, has_to: bool, abnormal_only: bool) -> str:
+    """Build the get_lab_results query for one combination of filters."""
+    query = """
+        SELECT test_name, test_date, result_value, unit, reference_range, 
+               abnormal_flag, status, loinc_code, provider, notes, id
+        FROM results
+    """
+    conditions = []
+    
+    # Build WHERE clause
+    if by_name:
+        conditions.append("test_name ILIKE ?")
+    
+    conditions += date_conditions("test_date", has_from, has_to)
+    
+    if abnormal_only:
+        conditions.append("abnormal_flag IS NOT NULL AND abnormal_flag != 'Normal'")
+    
+    # Filter out empty results
+    conditions.append("result_value IS NOT NULL AND result_value != ''")
+    
+    query += " WHERE " + " AND ".join(conditions)
+    # id breaks ties, so the summary query picks the same rows at the LIMIT
+    # and lists same-day readings in the same order
+    return query + " ORDER BY test_date DESC, test_name, id LIMIT ?"
+
+@lru_cache(maxsize=32)
+def _lab_summary_sql(detail_query: str) -> str:
+    """Build the lab summary query over the rows a get_lab_results query returns.
+    
+    Missing flags count as Normal, and recent tests are those from the last 30 days.
+    Recent tests are listed test by test, in the order the tests first appear
+    in the detail rows (newest test first), and newest first within a test.
+    """
+    abnormal = "COALESCE(abnormal_flag, '') NOT IN ('', 'Normal')"
+    return f"""
+        SELECT COUNT(*) FILTER (WHERE {abnormal}),
+               list({{'test': test_name, 'date': CAST(test_date AS VARCHAR),
+                      'value': result_value, 'abnormal': {abnormal}}}
+                    ORDER BY latest_test_date DESC, test_name, test_date DESC, id)
+                   FILTER (WHERE test_date >= CURRENT_DATE - INTERVAL 30 DAY)
+        FROM (
+            SELECT *, MAX(test_date) OVER (PARTITION BY test_name) AS latest_test_date
+            FROM ({detail_query})
+        )
+    """
+
+# Base query for each vital type get_vitals formats separately; any other
+# type reads every vital column
+_VITALS_SQL = {
+    "bp": """
+        SELECT measurement_date, systolic_bp, diastolic_bp, notes
+        FROM vitals 
+        WHERE (systolic_bp IS NOT NULL OR diastolic_bp IS NOT NULL)
+    """,
+    # DECIMAL columns would come back as Decimal objects; the conversion
+    # and trend math want plain floats
+    "weight": """
+        SELECT measurement_date, CAST(weight_kg AS DOUBLE), CAST(bmi AS DOUBLE), notes
+        FROM vitals 
+        WHERE weight_kg IS NOT NULL
+    """,
+    "height": """
+        SELECT measurement_date, height_cm, notes
+        FROM vitals 
+        WHERE height_cm IS NOT NULL
+    """,
+    "heart_rate": """
+        SELECT measurement_date, heart_rate, notes
+        FROM vitals 
+        WHERE heart_rate IS NOT NULL
+    """,
+    "all": """
+        SELECT measurement_date, measurement_time, height_cm, weight_kg, bmi,
+               systolic_bp, diastolic_bp, heart_rate, temperature_c, 
+               respiratory_rate, oxygen_saturation, notes
+        FROM vitals
+    """
+}
+
+@lru_cache(maxsize=32)
+def _vitals_sql(vital_type: str, has_from: bool, has_to: bool) -> str:
+    """Build the get_vitals query for one vital type and combination of date filters."""
+    query = _VITALS_SQL[vital_type]
+    
+    additional_conditions = date_conditions("measurement_date", has_from, has_to)
+    
+    if additional_conditions:
+        if "WHERE" in query:
+            query += " AND " + " AND ".join(additional_conditions)
+        else:
+            query += " WHERE " + " AND ".join(additional_conditions)
+    
+    return query + " ORDER BY measurement_date DESC LIMIT ?"
+
+@lru_cache(maxsize=32)
+def _conditions_sql(by_status: bool, by_name: bool) -> str:
+    """Build the get_conditions query for one combination of filters."""
+    query = """
+        SELECT problem_name, icd10_code, snomed_code, onset_date, 
+               resolution_date, status, severity, notes, LOWER(status)
+        FROM problems
+    """
+    conditions = []
+    
+    if by_status:
+        conditions.append("LOWER(status) = ?")
+    
+    if by_name:
+        conditions.append("problem_name ILIKE ?")
+    
+    if conditions:
+        query += " WHERE " + " AND ".join(conditions)
+    
+    return query + " ORDER BY onset_date DESC"
+
 class HealthQueryEngine:
     """Handles complex health data queries with medical domain knowledge."""
     
-    def __init__(self, db_connection):
+    def __init__(self, db_connection, min_size: int = 1, max_size: int = 5):
+        """Query through cursors on db_connection, pooling between min_size and max_size of them."""
         self.conn = db_connection
+        self.min_size = min_size
+        self.max_size = max(min_size, max_size)
+        self._pool = None
+        self._pool_opened = 0
+        
+        # get_vitals formatter for each vital type in _VITALS_SQL
+        self._vitals_handlers = {
+            "bp": self._format_bp_vitals,
+            "weight": self._format_weight_vitals,
+            "height": partial(self._format_single_vitals, "Height", "height_cm"),
+            "heart_rate": partial(self._format_single_vitals, "Heart Rate", "heart_rate"),
+            "all": self._format_all_vitals
+        }
+    
+    @asynccontextmanager
+    async def _acquire(self):
+        """Check a cursor out of the pool, opening another while below max_size."""
+        if self._pool is None:
+            self._pool = asyncio.Queue()
+            for _ in range(self.min_size):
+                self._pool.put_nowait(self.conn.cursor())
+            self._pool_opened = self.min_size
+        
+        if self._pool.empty() and self._pool_opened < self.max_size:
+            self._pool_opened += 1
+            cursor = self.conn.cursor()
+        else:
+            cursor = await self._pool.get()
+        
+        try:
+            yield cursor
+        finally:
+            self._pool.put_nowait(cursor)
+    
+    async def _execute(self, query: str, params, fetch: str):
+        """Run a query on a pooled cursor in a worker thread so the event loop stays free."""
+        async with self._acquire() as cursor:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(
+                None, lambda: getattr(cursor.execute(query, params or []), fetch)()
+            )
+    
+    async def fetchall(self, query: str, params: Optional[List] = None) -> List[Tuple]:
+        """Fetch all rows for a query on a pooled cursor, off the event loop."""
+        return await self._execute(query, params, 'fetchall')
+    
+    async def fetchone(self, query: str, params: Optional[List] = None) -> Optional[Tuple]:
+        """Fetch the first row for a query on a pooled cursor, off the event loop."""
+        return await self._execute(query, params, 'fetchone')
     
     async def get_lab_results(self, test_name: str = None, date_from: str = None, 
                              date_to: str = None, abnormal_only: bool = False, 
                              limit: int = 100) -> str:
         """Get lab results with intelligent filtering and analysis."""
         
-        query = """
-            SELECT test_name, test_date, result_value, unit, reference_range, 
-                   abnormal_flag, status, loinc_code, provider, notes
-            FROM results
-        """
-        params = []
-        conditions = []
-        
-        # Build WHERE clause
-        if test_name:
-            conditions.append("LOWER(test_name) LIKE ?")
-            params.append(f"%{test_name.lower()}%")
-        
-        if date_from:
-            conditions.append("test_date >= ?")
-            params.append(date_from)
-        
-        if date_to:
-            conditions.append("test_date <= ?")
-            params.append(date_to)
-        
-        if abnormal_only:
-            conditions.append("abnormal_flag IS NOT NULL AND abnormal_flag != 'Normal'")
-        
-        # Filter out empty results
-        conditions.append("result_value IS NOT NULL AND result_value != ''")
-        
-        if conditions:
-            query += " WHERE " + " AND ".join(conditions)
-        
-        query += " ORDER BY test_date DESC, test_name LIMIT ?"
-        params.append(limit)
+        query = _lab_results_sql(bool(test_name), bool(date_from), bool(date_to), bool(abnormal_only))
         
         try:
-            results = self.conn.execute(query, params).fetchall()
+            params = []
+            if test_name:
+                params.append(f"%{test_name}%")
+            params += date_params(date_from, date_to)
+            params.append(limit)
+            
+            # The summary aggregates the same rows in SQL, alongside the detail query
+            results, (abnormal_count, recent_tests) = await asyncio.gather(
+                self.fetchall(query, params),
+                self.fetchone(_lab_summary_sql(query), params)
+            )
             
             if not results:
                 return "No lab results found matching the criteria."
@@ -70,7 +292,7 @@ class HealthQueryEngine:
                     test_groups[test_name_key] = []
                 
                 test_groups[test_name_key].append({
-                    "date": str(row[1]) if row[1] else None,
+                    "date": row[1],
                     "value": row[2],
                     "unit": row[3] or "",
                     "reference_range": row[4] or "",
@@ -85,12 +307,16 @@ class HealthQueryEngine:
             for test_name_key, test_results in test_groups.items():
                 test_groups[test_name_key] = self._add_trend_analysis(test_results)
             
-            return json.dumps({
+            return to_json({
                 "total_found": len(results),
                 "unique_tests": len(test_groups),
                 "test_results": test_groups,
-                "summary": self._generate_lab_summary(test_groups)
-            }, indent=2)
+                "summary": {
+                    "total_tests": len(test_groups),
+                    "abnormal_results": abnormal_count,
+                    "recent_tests": recent_tests or []
+                }
+            })
             
         except Exception as e:
             logger.error(f"Error in get_lab_results: {e}")
@@ -100,202 +326,172 @@ class HealthQueryEngine:
                         vital_type: str = "all", limit: int = 100) -> str:
         """Get vital signs with trend analysis."""
         
-        # Build query based on vital type
-        if vital_type == "bp":
-            query = """
-                SELECT measurement_date, systolic_bp, diastolic_bp, notes
-                FROM vitals 
-                WHERE systolic_bp IS NOT NULL OR diastolic_bp IS NOT NULL
-            """
-        elif vital_type == "weight":
-            query = """
-                SELECT measurement_date, weight_kg, bmi, notes
-                FROM vitals 
-                WHERE weight_kg IS NOT NULL
-            """
-        elif vital_type == "height":
-            query = """
-                SELECT measurement_date, height_cm, notes
-                FROM vitals 
-                WHERE height_cm IS NOT NULL
-            """
-        elif vital_type == "heart_rate":
-            query = """
-                SELECT measurement_date, heart_rate, notes
-                FROM vitals 
-                WHERE heart_rate IS NOT NULL
-            """
-        else:  # all vitals
-            query = """
-                SELECT measurement_date, measurement_time, height_cm, weight_kg, bmi,
-                       systolic_bp, diastolic_bp, heart_rate, temperature_c, 
-                       respiratory_rate, oxygen_saturation, notes
-                FROM vitals
-            """
-        
-        params = []
-        additional_conditions = []
-        
-        if date_from:
-            additional_conditions.append("measurement_date >= ?")
-            params.append(date_from)
-        
-        if date_to:
-            additional_conditions.append("measurement_date <= ?")
-            params.append(date_to)
-        
-        if additional_conditions:
-            if "WHERE" in query:
-                query += " AND " + " AND ".join(additional_conditions)
-            else:
-                query += " WHERE " + " AND ".join(additional_conditions)
-        
-        query += " ORDER BY measurement_date DESC LIMIT ?"
-        params.append(limit)
+        # Types without their own query and formatter read every vital column
+        if vital_type not in self._vitals_handlers:
+            vital_type = "all"
+        query = _vitals_sql(vital_type, bool(date_from), bool(date_to))
         
         try:
-            results = self.conn.execute(query, params).fetchall()
+            params = date_params(date_from, date_to)
+            params.append(limit)
+            results = await self.fetchall(query, params)
             
             if not results:
                 return "No vital signs found matching the criteria."
             
-            # Format results based on vital type
-            if vital_type == "bp":
-                vitals = []
-                for row in results:
-                    if row[1] or row[2]:  # systolic or diastolic
-                        vitals.append({
-                            "date": str(row[0]),
-                            "systolic": row[1],
-                            "diastolic": row[2],
-                            "bp_reading": f"{row[1] or '?'}/{row[2] or '?'}",
-                            "category": self._categorize_blood_pressure(row[1], row[2]),
-                            "notes": row[3] or ""
-                        })
-                
-                # Add trend analysis for BP
-                trends = self._analyze_bp_trends(vitals)
-                
-                return json.dumps({
-                    "vital_type": "Blood Pressure",
-                    "total_readings": len(vitals),
-                    "readings": vitals,
-                    "trends": trends
-                }, indent=2)
-            
-            elif vital_type == "weight":
-                vitals = []
-                for row in results:
-                    if row[1]:  # weight_kg
-                        vitals.append({
-                            "date": str(row[0]),
-                            "weight_kg": row[1],
-                            "weight_lbs": round(row[1] * 2.20462, 1),
-                            "bmi": row[2],
-                            "notes": row[3] or ""
-                        })
-                
-                trends = self._analyze_weight_trends(vitals)
-                
-                return json.dumps({
-                    "vital_type": "Weight",
-                    "total_readings": len(vitals),
-                    "readings": vitals,
-                    "trends": trends
-                }, indent=2)
-            
-            else:  # all vitals
-                vitals = []
-                for row in results:
-                    vital_entry = {
-                        "date": str(row[0]),
-                        "time": str(row[1]) if row[1] else None,
-                    }
-                    
-                    # Add non-null vital measurements
-                    if row[2]: vital_entry["height_cm"] = row[2]
-                    if row[3]: vital_entry["weight_kg"] = row[3]
-                    if row[4]: vital_entry["bmi"] = row[4]
-                    if row[5] or row[6]: 
-                        vital_entry["blood_pressure"] = f"{row[5] or '?'}/{row[6] or '?'}"
-                        vital_entry["bp_category"] = self._categorize_blood_pressure(row[5], row[6])
-                    if row[7]: vital_entry["heart_rate"] = row[7]
-                    if row[8]: vital_entry["temperature_c"] = row[8]
-                    if row[9]: vital_entry["respiratory_rate"] = row[9]
-                    if row[10]: vital_entry["oxygen_saturation"] = row[10]
-                    if row[11]: vital_entry["notes"] = row[11]
-                    
-                    vitals.append(vital_entry)
-                
-                return json.dumps({
-                    "vital_type": "All Vitals",
-                    "total_readings": len(vitals),
-                    "readings": vitals
-                }, indent=2)
+            return self._vitals_handlers[vital_type](results)
             
         except Exception as e:
             logger.error(f"Error in get_vitals: {e}")
             return f"Error retrieving vital signs: {str(e)}"
     
+    def _format_bp_vitals(self, results: List[Tuple]) -> str:
+        """Format blood pressure readings with their trends."""
+        vitals = []
+        for row in results:
+            if row[1] or row[2]:  # systolic or diastolic
+                vitals.append({
+                    "date": row[0],
+                    "systolic": row[1],
+                    "diastolic": row[2],
+                    "bp_reading": f"{row[1] or '?'}/{row[2] or '?'}",
+                    "category": self._categorize_blood_pressure(row[1], row[2]),
+                    "notes": row[3] or ""
+                })
+        
+        # Add trend analysis for BP
+        trends = self._analyze_bp_trends(vitals)
+        
+        return to_json({
+            "vital_type": "Blood Pressure",
+            "total_readings": len(vitals),
+            "readings": vitals,
+            "trends": trends
+        })
+    
+    def _format_weight_vitals(self, results: List[Tuple]) -> str:
+        """Format weight readings with their trends."""
+        vitals = []
+        for row in results:
+            if row[1]:  # weight_kg
+                vitals.append({
+                    "date": row[0],
+                    "weight_kg": row[1],
+                    "weight_lbs": round(row[1] * 2.20462, 1),
+                    "bmi": row[2],
+                    "notes": row[3] or ""
+                })
+        
+        trends = self._analyze_weight_trends(vitals)
+        
+        return to_json({
+            "vital_type": "Weight",
+            "total_readings": len(vitals),
+            "readings": vitals,
+            "trends": trends
+        })
+    
+    def _format_single_vitals(self, label: str, column: str, results: List[Tuple]) -> str:
+        """Format (date, value, notes) rows for a single vital sign."""
+        vitals = [
+            {"date": row[0], column: row[1], "notes": row[2] or ""}
+            for row in results
+        ]
+        
+        return to_json({
+            "vital_type": label,
+            "total_readings": len(vitals),
+            "readings": vitals
+        })
+    
+    def _format_all_vitals(self, results: List[Tuple]) -> str:
+        """Format every recorded vital sign, skipping empty measurements."""
+        # Readings stay one object per row: MCP clients read this
+        # layout, and the LIMIT caps the rows built here, so a
+        # columnar (Arrow/NumPy) fetch would add dependencies
+        # without a measurable saving
+        vitals = []
+        for row in results:
+            vital_entry = {
+                "date": row[0],
+                "time": row[1],
+            }
+            
+            # Add non-null vital measurements
+            if row[2]: vital_entry["height_cm"] = row[2]
+            if row[3]: vital_entry["weight_kg"] = row[3]
+            if row[4]: vital_entry["bmi"] = row[4]
+            if row[5] or row[6]: 
+                vital_entry["blood_pressure"] = f"{row[5] or '?'}/{row[6] or '?'}"
+                vital_entry["bp_category"] = self._categorize_blood_pressure(row[5], row[6])
+            if row[7]: vital_entry["heart_rate"] = row[7]
+            if row[8]: vital_entry["temperature_c"] = row[8]
+            if row[9]: vital_entry["respiratory_rate"] = row[9]
+            if row[10]: vital_entry["oxygen_saturation"] = row[10]
+            if row[11]: vital_entry["notes"] = row[11]
+            
+            vitals.append(vital_entry)
+        
+        return to_json({
+            "vital_type": "All Vitals",
+            "total_readings": len(vitals),
+            "readings": vitals
+        })
+    
     async def get_conditions(self, status: str = "all", condition_name: str = None) -> str:
         """Get medical conditions and problems."""
         
-        query = """
-            SELECT problem_name, icd10_code, snomed_code, onset_date, 
-                   resolution_date, status, severity, notes
-            FROM problems
-        """
         params = []
-        conditions = []
-        
         if status != "all":
-            conditions.append("LOWER(status) = ?")
             params.append(status.lower())
-        
         if condition_name:
-            conditions.append("LOWER(problem_name) LIKE ?")
-            params.append(f"%{condition_name.lower()}%")
-        
-        if conditions:
-            query += " WHERE " + " AND ".join(conditions)
+            params.append(f"%{condition_name}%")
         
-        query += " ORDER BY onset_date DESC"
+        query = _conditions_sql(status != "all", bool(condition_name))
         
         try:
-            results = self.conn.execute(query, params).fetchall()
+            results = await self.fetchall(query, params)
             
             if not results:
                 return "No medical conditions found matching the criteria."
             
+            # Sort conditions into active, resolved and chronic while building
+            # them, and read the clock once for every unresolved duration
+            today = date.today()
             conditions_list = []
+            active_conditions = []
+            resolved_conditions = []
+            chronic_conditions = []
             for row in results:
                 condition = {
                     "condition": row[0],
                     "icd10_code": row[1] or "",
                     "snomed_code": row[2] or "",
-                    "onset_date": str(row[3]) if row[3] else None,
-                    "resolution_date": str(row[4]) if row[4] else None,
+                    "onset_date": row[3],
+                    "resolution_date": row[4],
                     "status": row[5] or "Unknown",
                     "severity": row[6] or "",
-                    "duration": self._calculate_condition_duration(row[3], row[4]),
+                    "duration": self._calculate_condition_duration(row[3], row[4], today),
                     "notes": row[7] or ""
                 }
                 conditions_list.append(condition)
+                if row[8] == "active":
+                    active_conditions.append(condition)
+                    if self._is_chronic_condition(condition):
+                        chronic_conditions.append(condition)
+                elif row[8] == "resolved":
+                    resolved_conditions.append(condition)
             
-            # Categorize conditions
-            active_conditions = [c for c in conditions_list if c["status"].lower() == "active"]
-            resolved_conditions = [c for c in conditions_list if c["status"].lower() == "resolved"]
-            
-            return json.dumps({
+            return to_json({
                 "total_conditions": len(conditions_list),
                 "active_conditions": len(active_conditions),
                 "resolved_conditions": len(resolved_conditions),
                 "conditions": conditions_list,
                 "summary": {
                     "most_recent": conditions_list[0] if conditions_list else None,
-                    "chronic_conditions": [c for c in active_conditions if self._is_chronic_condition(c)]
+                    "chronic_conditions": chronic_conditions
                 }
-            }, indent=2)
+            })
             
         except Exception as e:
             logger.error(f"Error in get_conditions: {e}")
@@ -313,25 +509,36 @@ class HealthQueryEngine:
                 "alerts": []
             }
             
+            # The sections are independent queries, so run them concurrently
+            # on pooled cursors
+            (counts, latest_lab, latest_vitals, (active_medications, active_conditions),
+             metrics, alerts) = await asyncio.gather(
+                self._get_record_counts(),
+                self._get_latest_lab_result(),
+                self._get_latest_vital_signs(),
+                self._get_active_counts(),
+                self._get_key_health_metrics() if include_trends else asyncio.sleep(0, result={}),
+                self._generate_health_alerts()
+            )
+            
             # Get record counts
-            summary["overview"] = await self._get_record_counts()
+            summary["overview"] = counts
             
             # Get latest data from each category
             summary["latest_data"] = {
-                "latest_lab_result": await self._get_latest_lab_result(),
-                "latest_vital_signs": await self._get_latest_vital_signs(),
-                "active_medications": await self._get_active_medication_count(),
-                "active_conditions": await self._get_active_condition_count()
+                "latest_lab_result": latest_lab,
+                "latest_vital_signs": latest_vitals,
+                "active_medications": active_medications,
+                "active_conditions": active_conditions
             }
             
             # Get key health metrics
-            if include_trends:
-                summary["key_metrics"] = await self._get_key_health_metrics()
+            summary["key_metrics"] = metrics
             
             # Generate health alerts
-            summary["alerts"] = await self._generate_health_alerts()
+            summary["alerts"] = alerts
             
-            return json.dumps(summary, indent=2)
+            return to_json(summary)
             
         except Exception as e:
             logger.error(f"Error in get_health_summary: {e}")
@@ -344,82 +551,52 @@ class HealthQueryEngine:
         if len(test_results) < 2:
             return test_results
         
-        # Try to extract numeric values for trend analysis
+        # Results arrive newest first (ORDER BY test_date DESC), so the trend
+        # only needs the first two numeric values; stop scanning there
         numeric_values = []
         for result in test_results:
+            # One float() parse classifies and converts the value; text such
+            # as "Positive" raises, and nan/inf are not measurements
             try:
-                # Extract numeric part from result_value
-                value_str = str(result["value"]).strip()
-                if value_str and value_str.replace(".", "").replace("-", "").isdigit():
-                    numeric_values.append((result["date"], float(value_str)))
+                value = float(result["value"])
             except (ValueError, TypeError):
                 continue
+            if math.isfinite(value):
+                numeric_values.append((result, value))
+                if len(numeric_values) == 2:
+                    break
         
         if len(numeric_values) >= 2:
-            # Sort by date
-            numeric_values.sort(key=lambda x: x[0])
-            
             # Calculate trend
-            latest_value = numeric_values[-1][1]
-            previous_value = numeric_values[-2][1]
+            latest_value = numeric_values[0][1]
+            previous_value = numeric_values[1][1]
             change = latest_value - previous_value
             percent_change = (change / previous_value * 100) if previous_value != 0 else 0
             
-            # Add trend info to the most recent result
-            for result in test_results:
-                if result["date"] == numeric_values[-1][0]:
-                    result["trend"] = {
-                        "direction": "increasing" if change > 0 else "decreasing" if change < 0 else "stable",
-                        "change": round(change, 2),
-                        "percent_change": round(percent_change, 1)
-                    }
-                    break
+            # Add trend info to the most recent numeric result
+            numeric_values[0][0]["trend"] = {
+                "direction": "increasing" if change > 0 else "decreasing" if change < 0 else "stable",
+                "change": round(change, 2),
+                "percent_change": round(percent_change, 1)
+            }
         
         return test_results
     
-    def _generate_lab_summary(self, test_groups: Dict) -> Dict:
-        """Generate summary of lab results."""
-        summary = {
-            "total_tests": len(test_groups),
-            "abnormal_results": 0,
-            "recent_tests": []
-        }
-        
-        for test_name, results in test_groups.items():
-            for result in results:
-                if result["abnormal_flag"] and result["abnormal_flag"] != "Normal":
-                    summary["abnormal_results"] += 1
-                
-                # Add to recent tests (within last 30 days)
-                try:
-                    result_date = datetime.strptime(result["date"], "%Y-%m-%d")
-                    if (datetime.now() - result_date).days <= 30:
-                        summary["recent_tests"].append({
-                            "test": test_name,
-                            "date": result["date"],
-                            "value": result["value"],
-                            "abnormal": result["abnormal_flag"] != "Normal"
-                        })
-                except (ValueError, TypeError):
-                    continue
-        
-        return summary
-    
-    def _categorize_blood_pressure(self, systolic: Optional[int], diastolic: Optional[int]) -> str:
-        """Categorize blood pressure reading."""
+    @staticmethod
+    @lru_cache(maxsize=1024)
+    def _categorize_blood_pressure(systolic: Optional[int], diastolic: Optional[int]) -> str:
+        """Categorize blood pressure reading; readings repeat often, so results are cached."""
         if not systolic or not diastolic:
             return "Incomplete reading"
         
-        if systolic < 120 and diastolic < 80:
-            return "Normal"
-        elif systolic < 130 and diastolic < 80:
-            return "Elevated"
-        elif systolic < 140 or diastolic < 90:
-            return "Stage 1 Hypertension"
-        elif systolic < 180 or diastolic < 120:
-            return "Stage 2 Hypertension"
-        else:
-            return "Hypertensive Crisis"
+        # Normal and Elevated need both readings under their limits; from
+        # Stage 1 up, the lower of the two readings' levels decides
+        systolic_level = bisect.bisect_right(_SYSTOLIC_LIMITS, systolic)
+        diastolic_level = bisect.bisect_right(_DIASTOLIC_LIMITS, diastolic)
+        level = max(systolic_level, diastolic_level)
+        if level > 1:
+            level = max(2, min(systolic_level, diastolic_level))
+        return _BP_CATEGORIES[level]
     
     def _analyze_bp_trends(self, bp_readings: List[Dict]) -> Dict:
         """Analyze blood pressure trends."""
@@ -464,12 +641,13 @@ class HealthQueryEngine:
         
         return {"trend": "Insufficient data"}
     
-    def _calculate_condition_duration(self, onset_date: Optional[date], resolution_date: Optional[date]) -> Optional[str]:
-        """Calculate duration of a medical condition."""
+    def _calculate_condition_duration(self, onset_date: Optional[date], resolution_date: Optional[date],
+                                      today: Optional[date] = None) -> Optional[str]:
+        """Calculate duration of a medical condition, up to today if it is unresolved."""
         if not onset_date:
             return None
         
-        end_date = resolution_date or date.today()
+        end_date = resolution_date or today or date.today()
         duration = end_date - onset_date
         
         if duration.days < 30:
@@ -483,22 +661,27 @@ class HealthQueryEngine:
     
     def _is_chronic_condition(self, condition: Dict) -> bool:
         """Determine if a condition is chronic."""
-        chronic_keywords = [
-            "diabetes", "hypertension", "asthma", "copd", "arthritis", 
-            "depression", "anxiety", "chronic", "syndrome"
-        ]
-        
-        condition_name = condition["condition"].lower()
-        return any(keyword in condition_name for keyword in chronic_keywords)
+        return _CHRONIC_CONDITION.search(condition["condition"]) is not None
     
     async def _get_record_counts(self) -> Dict:
         """Get record counts for all tables."""
         counts = {}
         tables = ["medications", "results", "vitals", "problems", "procedures", "immunizations"]
         
+        # One statement for every table; the names are fixed above, not user input
+        try:
+            rows = await self.fetchall(" UNION ALL ".join(
+                f"SELECT '{table}' AS name, COUNT(*) AS n FROM {table}" for table in tables
+            ))
+            found = dict(rows)
+            return {table: found[table] for table in tables}
+        except Exception:
+            pass
+        
+        # A missing table fails the combined query; count the rest one by one
         for table in tables:
             try:
-                count = self.conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+                count = (await self.fetchone(f"SELECT COUNT(*) FROM {table}"))[0]
                 counts[table] = count
             except Exception:
                 counts[table] = 0
@@ -508,13 +691,13 @@ class HealthQueryEngine:
     async def _get_latest_lab_result(self) -> Optional[Dict]:
         """Get the most recent lab result."""
         try:
-            result = self.conn.execute("""
+            result = await self.fetchone("""
                 SELECT test_name, test_date, result_value, unit 
                 FROM results 
                 WHERE test_date IS NOT NULL 
                 ORDER BY test_date DESC 
                 LIMIT 1
-            """).fetchone()
+            """)
             
             if result:
                 return {
@@ -531,16 +714,16 @@ class HealthQueryEngine:
     async def _get_latest_vital_signs(self) -> Optional[Dict]:
         """Get the most recent vital signs."""
         try:
-            result = self.conn.execute("""
+            result = await self.fetchone("""
                 SELECT measurement_date, systolic_bp, diastolic_bp, weight_kg 
                 FROM vitals 
                 WHERE measurement_date IS NOT NULL 
                 ORDER BY measurement_date DESC 
                 LIMIT 1
-            """).fetchone()
+            """)
             
             if result:
-                vital = {"date": str(result[0])}
+                vital = {"date": result[0]}
                 if result[1] and result[2]:
                     vital["blood_pressure"] = f"{result[1]}/{result[2]}"
                 if result[3]:
@@ -551,27 +734,15 @@ class HealthQueryEngine:
         
         return None
     
-    async def _get_active_medication_count(self) -> int:
-        """Get count of active medications."""
-        try:
-            count = self.conn.execute("""
-                SELECT COUNT(*) FROM medications 
-                WHERE LOWER(status) = 'active'
-            """).fetchone()[0]
-            return count
-        except Exception:
-            return 0
-    
-    async def _get_active_condition_count(self) -> int:
-        """Get count of active conditions."""
+    async def _get_active_counts(self) -> Tuple[int, int]:
+        """Get counts of active medications and active conditions in one query."""
         try:
-            count = self.conn.execute("""
-                SELECT COUNT(*) FROM problems 
-                WHERE LOWER(status) = 'active'
-            """).fetchone()[0]
-            return count
+            return await self.fetchone("""
+                SELECT (SELECT COUNT(*) FROM medications WHERE LOWER(status) = 'active'),
+                       (SELECT COUNT(*) FROM problems WHERE LOWER(status) = 'active')
+            """)
         except Exception:
-            return 0
+            return 0, 0
     
     async def _get_key_health_metrics(self) -> Dict:
         """Get key health metrics with trends."""
@@ -579,16 +750,16 @@ class HealthQueryEngine:
         
         # Latest BMI
         try:
-            bmi_result = self.conn.execute("""
+            bmi_result = await self.fetchone("""
                 SELECT bmi, measurement_date FROM vitals 
                 WHERE bmi IS NOT NULL 
                 ORDER BY measurement_date DESC 
                 LIMIT 1
-            """).fetchone()
+            """)
             if bmi_result:
                 metrics["latest_bmi"] = {
                     "value": bmi_result[0],
-                    "date": str(bmi_result[1]),
+                    "date": bmi_result[1],
                     "category": self._categorize_bmi(bmi_result[0])
                 }
         except Exception:
@@ -596,18 +767,18 @@ class HealthQueryEngine:
         
         # Blood pressure trend
         try:
-            bp_results = self.conn.execute("""
+            bp_results = await self.fetchall("""
                 SELECT systolic_bp, diastolic_bp, measurement_date FROM vitals 
                 WHERE systolic_bp IS NOT NULL AND diastolic_bp IS NOT NULL 
                 ORDER BY measurement_date DESC 
                 LIMIT 5
-            """).fetchall()
+            """)
             
             if bp_results:
                 latest_bp = bp_results[0]
                 metrics["blood_pressure"] = {
                     "latest": f"{latest_bp[0]}/{latest_bp[1]}",
-                    "date": str(latest_bp[2]),
+                    "date": latest_bp[2],
                     "category": self._categorize_blood_pressure(latest_bp[0], latest_bp[1])
                 }
         except Exception:
@@ -621,14 +792,14 @@ class HealthQueryEngine:
         
         # Check for abnormal recent lab results
         try:
-            abnormal_results = self.conn.execute("""
+            abnormal_results = await self.fetchall("""
                 SELECT test_name, test_date, result_value, abnormal_flag 
                 FROM results 
                 WHERE abnormal_flag IS NOT NULL 
                 AND abnormal_flag != 'Normal' 
-                AND test_date > date('now', '-30 days')
+                AND test_date > CURRENT_DATE - INTERVAL 30 DAY
                 ORDER BY test_date DESC
-            """).fetchall()
+            """)
             
             for result in abnormal_results:
                 alerts.append({
@@ -642,12 +813,12 @@ class HealthQueryEngine:
         
         # Check for missing recent vitals
         try:
-            latest_vital = self.conn.execute("""
-                SELECT MAX(measurement_date) FROM vitals
-            """).fetchone()[0]
+            # The database does the date arithmetic; NULL when there are no vitals
+            days_since = (await self.fetchone("""
+                SELECT date_diff('day', MAX(measurement_date), CURRENT_DATE) FROM vitals
+            """))[0]
             
-            if latest_vital:
-                days_since = (datetime.now().date() - datetime.strptime(str(latest_vital), "%Y-%m-%d").date()).days
+            if days_since is not None:
                 if days_since > 90:
                     alerts.append({
                         "type": "missing_vitals",
@@ -661,11 +832,4 @@ class HealthQueryEngine:
     
     def _categorize_bmi(self, bmi: float) -> str:
         """Categorize BMI value."""
-        if bmi < 18.5:
-            return "Underweight"
-        elif bmi < 25:
-            return "Normal weight"
-        elif bmi < 30:
-            return "Overweight"
-        else:
-            return "Obese"
\ No newline at end of file
+        return _BMI_CATEGORIES[bisect.bisect_right(_BMI_LIMITS, bmi)]
\ No newline at end of file
@@ -8,10 +8,11 @@ context-aware tools for querying health information.
 """
 
 import asyncio
-import json
 import logging
+import time
 from datetime import datetime, date
-from typing import Any, Dict, List, Optional, Union
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple, Union
 from pathlib import Path
 
 import duckdb
@@ -26,19 +27,405 @@ from mcp.types import (
     LoggingLevel
 )
 import mcp.types as types
-from health_queries import HealthQueryEngine
+from health_queries import HealthQueryEngine, date_conditions, date_params, to_json
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("health-mcp-server")
 
+# Seconds a database summary resource is served from cache
+_SUMMARY_TTL = 60
+
+# Connection settings for serving. Queries only read a personal record, so
+# DuckDB gets a smaller memory budget than a load run.
+_CONNECTION_CONFIG = {
+    'memory_limit': '2GB'
+}
+
+# Vitals columns charted for each analyze_trends metric keyword
+_VITAL_TREND_COLUMNS = {
+    "blood_pressure": ("systolic_bp", "diastolic_bp"),
+    "weight": ("weight_kg",),
+    "bmi": ("bmi",),
+    "heart_rate": ("heart_rate",)
+}
+
+# As in health_queries, each tool's SQL is built once per combination of
+# optional filters; DuckDB's Python API has no prepared-statement handle to
+# keep, so parameters are still bound per call
+
+# Each timeline event type's table and date column, and the STRUCT it
+# contributes to get_health_timeline
+_TIMELINE_EVENTS = {
+    "medications": ("medications", "start_date", """
+        {'type': 'medication', 'description': 'Started ' || medication_name,
+         'date': CAST(start_date AS VARCHAR), 'status': status, 'provider': prescriber}
+    """),
+    "procedures": ("procedures", "procedure_date", """
+        {'type': 'procedure', 'description': procedure_name,
+         'date': CAST(procedure_date AS VARCHAR), 'status': status, 'provider': provider}
+    """),
+    "conditions": ("problems", "onset_date", """
+        {'type': 'condition', 'description': 'Diagnosed with ' || problem_name,
+         'date': CAST(onset_date AS VARCHAR), 'status': status, 'provider': CAST(NULL AS VARCHAR)}
+    """),
+    "immunizations": ("immunizations", "administration_date", """
+        {'type': 'immunization', 'description': 'Received ' || vaccine_name,
+         'date': CAST(administration_date AS VARCHAR), 'status': CAST(NULL AS VARCHAR), 'provider': provider}
+    """)
+}
+
+@lru_cache(maxsize=32)
+def _timeline_sql(kinds: Tuple[str, ...], has_from: bool, has_to: bool, has_limit: bool) -> str:
+    """Build the get_health_timeline query for a set of event types and date filters.
+    
+    Each branch binds its own date parameters, in kinds order, then the limit
+    if there is one. A limited query also returns the untruncated event count
+    alongside each row.
+    """
+    branches = []
+    for position, kind in enumerate(kinds):
+        table, date_col, event = _TIMELINE_EVENTS[kind]
+        conditions = [f"{date_col} IS NOT NULL"] + date_conditions(date_col, has_from, has_to)
+        branches.append(
+            f"SELECT {event} AS event, {date_col} AS event_date, {position} AS position "
+            f"FROM {table} WHERE {' AND '.join(conditions)}"
+        )
+    
+    # Ties on a date keep the event types in kinds order
+    query = f"FROM ({' UNION ALL '.join(branches)}) ORDER BY event_date DESC, position"
+    if has_limit:
+        # The window count is taken before LIMIT applies
+        return f"SELECT event, COUNT(*) OVER () {query} LIMIT ?"
+    return f"SELECT event {query}"
+
+@lru_cache(maxsize=32)
+def _medications_sql(by_status: bool, by_name: bool) -> str:
+    """Build the get_medications query for one combination of filters."""
+    # Each row comes back as one STRUCT, which DuckDB converts straight to
+    # the response dict, so no per-row formatting happens in Python
+    query = """
+        SELECT {
+            'name': medication_name,
+            'dosage': COALESCE(NULLIF(dosage, ''), 'Not specified'),
+            'frequency': COALESCE(NULLIF(frequency, ''), 'Not specified'),
+            'status': status,
+            'start_date': CAST(start_date AS VARCHAR),
+            'end_date': CAST(end_date AS VARCHAR),
+            'prescriber': COALESCE(NULLIF(prescriber, ''), 'Not specified')
+        }
+        FROM medications
+    """
+    conditions = []
+    
+    if by_status:
+        conditions.append("LOWER(status) = ?")
+    
+    if by_name:
+        conditions.append("medication_name ILIKE ?")
+    
+    if conditions:
+        query += " WHERE " + " AND ".join(conditions)
+    
+    return query + " ORDER BY start_date DESC LIMIT ?"
+
+@lru_cache(maxsize=32)
+def _lab_trend_sql(has_from: bool, has_to: bool) -> Tuple[str, str, str]:
+    """Build the analyze_trends lab points, statistics and binned points queries for one combination of date filters.
+    
+    The binned query binds the bin count before and after the filter parameters.
+    """
+    # value is NULL unless result_value parses as a finite number
+    query = """
+        SELECT test_date, unit, reference_range,
+               CASE WHEN isfinite(TRY_CAST(result_value AS DOUBLE))
+                    THEN TRY_CAST(result_value AS DOUBLE) END AS value
+        FROM results 
+        WHERE test_name ILIKE ?
+    """
+    query += "".join(f" AND {condition}" for condition in date_conditions("test_date", has_from, has_to))
+    
+    # DuckDB filters the numeric values and computes the statistics;
+    # the points come back as STRUCTs in date order
+    numeric = "FILTER (WHERE value IS NOT NULL)"
+    points_query = f"""
+        SELECT {{'date': CAST(test_date AS VARCHAR), 'value': value,
+                'unit': COALESCE(unit, ''), 'reference_range': COALESCE(reference_range, '')}}
+        FROM ({query})
+        WHERE value IS NOT NULL
+        ORDER BY test_date ASC
+    """
+    stats_query = f"""
+        SELECT COUNT(*), COUNT(value), MIN(value), MAX(value), AVG(value),
+               arg_min(value, test_date) {numeric}, arg_max(value, test_date) {numeric},
+               CAST(MIN(test_date) {numeric} AS VARCHAR), CAST(MAX(test_date) {numeric} AS VARCHAR)
+        FROM ({query})
+    """
+    # Min/max downsampling: split the date range into equal-width bins and
+    # keep each bin's extremes, so spikes survive while rows shrink to bins
+    span = "epoch(MAX(test_date) OVER ()) - epoch(MIN(test_date) OVER ())"
+    binned_query = f"""
+        SELECT {{'date_from': CAST(MIN(test_date) AS VARCHAR), 'date_to': CAST(MAX(test_date) AS VARCHAR),
+                'min': MIN(value), 'max': MAX(value), 'readings': COUNT(*)}}
+        FROM (
+            SELECT test_date, value,
+                   FLOOR(? * (epoch(test_date) - epoch(MIN(test_date) OVER ())) / NULLIF({span}, 0)) AS bin
+            FROM ({query})
+            WHERE value IS NOT NULL
+        )
+        GROUP BY LEAST(bin, ? - 1)
+        ORDER BY MIN(test_date)
+    """
+    return points_query, stats_query, binned_query
+
+@lru_cache(maxsize=32)
+def _vital_trend_sql(columns: Tuple[str, ...], has_from: bool, has_to: bool) -> str:
+    """Build the analyze_trends vitals query for one set of columns and date filters."""
+    query = f"""
+        SELECT measurement_date, {', '.join(columns)}
+        FROM vitals 
+        WHERE ({' IS NOT NULL OR '.join(columns)} IS NOT NULL)
+    """
+    query += "".join(f" AND {condition}" for condition in date_conditions("measurement_date", has_from, has_to))
+    
+    return query + " ORDER BY measurement_date ASC"
+
+# Resources and tools the server advertises; they never change, so they are
+# built once at import rather than on every list request
+_RESOURCES = (
+    Resource(
+        uri="health://database/schema",
+        name="Health Database Schema",
+        description="Complete schema of the health database including all tables and relationships",
+        mimeType="application/json",
+    ),
+    Resource(
+        uri="health://database/summary",
+        name="Health Data Summary",
+        description="High-level summary of all health data including record counts and date ranges",
+        mimeType="application/json",
+    ),
+)
+
+_TOOLS = (
+    Tool(
+        name="get_medications",
+        description="Get medication information with optional filters",
+        inputSchema={
+            "type": "object",
+            "properties": {
+                "status": {
+                    "type": "string",
+                    "enum": ["active", "completed", "discontinued", "all"],
+                    "description": "Filter by medication status"
+                },
+                "medication_name": {
+                    "type": "string",
+                    "description": "Search for specific medication name (partial match)"
+                },
+                "limit": {
+                    "type": "integer",
+                    "description": "Limit number of results (default: 50)"
+                }
+            }
+        }
+    ),
+    Tool(
+        name="get_lab_results",
+        description="Get lab results with optional filters and trend analysis",
+        inputSchema={
+            "type": "object",
+            "properties": {
+                "test_name": {
+                    "type": "string",
+                    "description": "Search for specific test name (partial match)"
+                },
+                "date_from": {
+                    "type": "string",
+                    "format": "date",
+                    "description": "Start date for results (YYYY-MM-DD)"
+                },
+                "date_to": {
+                    "type": "string",
+                    "format": "date",
+                    "description": "End date for results (YYYY-MM-DD)"
+                },
+                "abnormal_only": {
+                    "type": "boolean",
+                    "description": "Show only abnormal results"
+                },
+                "limit": {
+                    "type": "integer",
+                    "description": "Limit number of results (default: 100)"
+                }
+            }
+        }
+    ),
+    Tool(
+        name="get_vitals",
+        description="Get vital signs with trend analysis",
+        inputSchema={
+            "type": "object",
+            "properties": {
+                "date_from": {
+                    "type": "string",
+                    "format": "date",
+                    "description": "Start date for vitals (YYYY-MM-DD)"
+                },
+                "date_to": {
+                    "type": "string",
+                    "format": "date",
+                    "description": "End date for vitals (YYYY-MM-DD)"
+                },
+                "vital_type": {
+                    "type": "string",
+                    "enum": ["bp", "weight", "height", "bmi", "heart_rate", "temperature", "all"],
+                    "description": "Specific vital sign type"
+                },
+                "limit": {
+                    "type": "integer",
+                    "description": "Limit number of results (default: 100)"
+                }
+            }
+        }
+    ),
+    Tool(
+        name="get_conditions",
+        description="Get current medical conditions and problems",
+        inputSchema={
+            "type": "object",
+            "properties": {
+                "status": {
+                    "type": "string",
+                    "enum": ["active", "resolved", "all"],
+                    "description": "Filter by condition status"
+                },
+                "condition_name": {
+                    "type": "string",
+                    "description": "Search for specific condition (partial match)"
+                }
+            }
+        }
+    ),
+    Tool(
+        name="get_health_summary",
+        description="Get comprehensive health summary with key metrics",
+        inputSchema={
+            "type": "object",
+            "properties": {
+                "include_trends": {
+                    "type": "boolean",
+                    "description": "Include trend analysis in summary"
+                }
+            }
+        }
+    ),
+    Tool(
+        name="search_health_data",
+        description="Search across all health data using natural language",
+        inputSchema={
+            "type": "object",
+            "properties": {
+                "query": {
+                    "type": "string",
+                    "description": "Natural language query about health data"
+                },
+                "data_types": {
+                    "type": "array",
+                    "items": {
+                        "type": "string",
+                        "enum": ["medications", "lab_results", "vitals", "conditions", "procedures", "immunizations"]
+                    },
+                    "description": "Limit search to specific data types"
+                },
+                "max_results": {
+                    "type": "integer",
+                    "description": "Stop searching once this many matches are found (default: 30)"
+                }
+            },
+            "required": ["query"]
+        }
+    ),
+    Tool(
+        name="analyze_trends",
+        description="Analyze trends in health metrics over time",
+        inputSchema={
+            "type": "object",
+            "properties": {
+                "metric_type": {
+                    "type": "string",
+                    "enum": ["lab_results", "vitals", "medications"],
+                    "description": "Type of metric to analyze"
+                },
+                "metric_name": {
+                    "type": "string",
+                    "description": "Specific metric name to analyze"
+                },
+                "date_from": {
+                    "type": "string",
+                    "format": "date",
+                    "description": "Start date for trend analysis"
+                },
+                "date_to": {
+                    "type": "string",
+                    "format": "date",
+                    "description": "End date for trend analysis"
+                },
+                "bins": {
+                    "type": "integer",
+                    "minimum": 1,
+                    "description": "Optional cap on lab data points. Longer series then come back as {date_from, date_to, min, max, readings} per date bin instead of individual readings (default: every reading)"
+                }
+            },
+            "required": ["metric_type", "metric_name"]
+        }
+    ),
+    Tool(
+        name="get_health_timeline",
+        description="Get chronological timeline of health events",
+        inputSchema={
+            "type": "object",
+            "properties": {
+                "date_from": {
+                    "type": "string",
+                    "format": "date",
+                    "description": "Start date for timeline"
+                },
+                "date_to": {
+                    "type": "string",
+                    "format": "date",
+                    "description": "End date for timeline"
+                },
+                "event_types": {
+                    "type": "array",
+                    "items": {
+                        "type": "string",
+                        "enum": ["medications", "procedures", "lab_results", "conditions", "immunizations"]
+                    },
+                    "description": "Types of events to include"
+                },
+                "limit": {
+                    "type": "integer",
+                    "description": "Return only this many events, most recent first (default: all)"
+                }
+            }
+        }
+    )
+)
+
 class HealthDataServer:
     """Main health data MCP server class."""
     
-    def __init__(self, db_path: str = "/Users/Shared/health_data.duckdb"):
+    def __init__(self, db_path: str = "/Users/Shared/health_data.duckdb", pool_size: int = 5,
+                 threads: Optional[int] = None):
+        """Serve db_path; threads caps DuckDB's worker threads, by default every core."""
         self.db_path = Path(db_path)
+        self.pool_size = pool_size
+        self.threads = threads
         self.conn = None
         self.query_engine = None
+        self._connect_lock = asyncio.Lock()
+        self._invalidate_caches()
         self.server = Server("health-data-server")
         self.setup_handlers()
     
@@ -48,20 +435,7 @@ class HealthDataServer:
         @self.server.list_resources()
         async def handle_list_resources() -> list[Resource]:
             """List available health data resources."""
-            return [
-                Resource(
-                    uri="health://database/schema",
-                    name="Health Database Schema",
-                    description="Complete schema of the health database including all tables and relationships",
-                    mimeType="application/json",
-                ),
-                Resource(
-                    uri="health://database/summary",
-                    name="Health Data Summary",
-                    description="High-level summary of all health data including record counts and date ranges",
-                    mimeType="application/json",
-                ),
-            ]
+            return list(_RESOURCES)
         
         @self.server.read_resource()
         async def handle_read_resource(uri: str) -> str:
@@ -76,198 +450,7 @@ class HealthDataServer:
         @self.server.list_tools()
         async def handle_list_tools() -> list[Tool]:
             """List available health data tools."""
-            return [
-                Tool(
-                    name="get_medications",
-                    description="Get medication information with optional filters",
-                    inputSchema={
-                        "type": "object",
-                        "properties": {
-                            "status": {
-                                "type": "string",
-                                "enum": ["active", "completed", "discontinued", "all"],
-                                "description": "Filter by medication status"
-                            },
-                            "medication_name": {
-                                "type": "string",
-                                "description": "Search for specific medication name (partial match)"
-                            },
-                            "limit": {
-                                "type": "integer",
-                                "description": "Limit number of results (default: 50)"
-                            }
-                        }
-                    }
-                ),
-                Tool(
-                    name="get_lab_results",
-                    description="Get lab results with optional filters and trend analysis",
-                    inputSchema={
-                        "type": "object",
-                        "properties": {
-                            "test_name": {
-                                "type": "string",
-                                "description": "Search for specific test name (partial match)"
-                            },
-                            "date_from": {
-                                "type": "string",
-                                "format": "date",
-                                "description": "Start date for results (YYYY-MM-DD)"
-                            },
-                            "date_to": {
-                                "type": "string",
-                                "format": "date",
-                                "description": "End date for results (YYYY-MM-DD)"
-                            },
-                            "abnormal_only": {
-                                "type": "boolean",
-                                "description": "Show only abnormal results"
-                            },
-                            "limit": {
-                                "type": "integer",
-                                "description": "Limit number of results (default: 100)"
-                            }
-                        }
-                    }
-                ),
-                Tool(
-                    name="get_vitals",
-                    description="Get vital signs with trend analysis",
-                    inputSchema={
-                        "type": "object",
-                        "properties": {
-                            "date_from": {
-                                "type": "string",
-                                "format": "date",
-                                "description": "Start date for vitals (YYYY-MM-DD)"
-                            },
-                            "date_to": {
-                                "type": "string",
-                                "format": "date",
-                                "description": "End date for vitals (YYYY-MM-DD)"
-                            },
-                            "vital_type": {
-                                "type": "string",
-                                "enum": ["bp", "weight", "height", "bmi", "heart_rate", "temperature", "all"],
-                                "description": "Specific vital sign type"
-                            },
-                            "limit": {
-                                "type": "integer",
-                                "description": "Limit number of results (default: 100)"
-                            }
-                        }
-                    }
-                ),
-                Tool(
-                    name="get_conditions",
-                    description="Get current medical conditions and problems",
-                    inputSchema={
-                        "type": "object",
-                        "properties": {
-                            "status": {
-                                "type": "string",
-                                "enum": ["active", "resolved", "all"],
-                                "description": "Filter by condition status"
-                            },
-                            "condition_name": {
-                                "type": "string",
-                                "description": "Search for specific condition (partial match)"
-                            }
-                        }
-                    }
-                ),
-                Tool(
-                    name="get_health_summary",
-                    description="Get comprehensive health summary with key metrics",
-                    inputSchema={
-                        "type": "object",
-                        "properties": {
-                            "include_trends": {
-                                "type": "boolean",
-                                "description": "Include trend analysis in summary"
-                            }
-                        }
-                    }
-                ),
-                Tool(
-                    name="search_health_data",
-                    description="Search across all health data using natural language",
-                    inputSchema={
-                        "type": "object",
-                        "properties": {
-                            "query": {
-                                "type": "string",
-                                "description": "Natural language query about health data"
-                            },
-                            "data_types": {
-                                "type": "array",
-                                "items": {
-                                    "type": "string",
-                                    "enum": ["medications", "lab_results", "vitals", "conditions", "procedures", "immunizations"]
-                                },
-                                "description": "Limit search to specific data types"
-                            }
-                        },
-                        "required": ["query"]
-                    }
-                ),
-                Tool(
-                    name="analyze_trends",
-                    description="Analyze trends in health metrics over time",
-                    inputSchema={
-                        "type": "object",
-                        "properties": {
-                            "metric_type": {
-                                "type": "string",
-                                "enum": ["lab_results", "vitals", "medications"],
-                                "description": "Type of metric to analyze"
-                            },
-                            "metric_name": {
-                                "type": "string",
-                                "description": "Specific metric name to analyze"
-                            },
-                            "date_from": {
-                                "type": "string",
-                                "format": "date",
-                                "description": "Start date for trend analysis"
-                            },
-                            "date_to": {
-                                "type": "string",
-                                "format": "date",
-                                "description": "End date for trend analysis"
-                            }
-                        },
-                        "required": ["metric_type", "metric_name"]
-                    }
-                ),
-                Tool(
-                    name="get_health_timeline",
-                    description="Get chronological timeline of health events",
-                    inputSchema={
-                        "type": "object",
-                        "properties": {
-                            "date_from": {
-                                "type": "string",
-                                "format": "date",
-                                "description": "Start date for timeline"
-                            },
-                            "date_to": {
-                                "type": "string",
-                                "format": "date",
-                                "description": "End date for timeline"
-                            },
-                            "event_types": {
-                                "type": "array",
-                                "items": {
-                                    "type": "string",
-                                    "enum": ["medications", "procedures", "lab_results", "conditions", "immunizations"]
-                                },
-                                "description": "Types of events to include"
-                            }
-                        }
-                    }
-                )
-            ]
+            return list(_TOOLS)
         
         @self.server.call_tool()
         async def handle_call_tool(name: str, arguments: dict) -> list[types.TextContent]:
@@ -301,40 +484,92 @@ class HealthDataServer:
                 return [types.TextContent(type="text", text=f"Error: {str(e)}")]
     
     async def _connect_db(self):
-        """Connect to the health database."""
-        if self.conn is None:
-            if not self.db_path.exists():
-                raise FileNotFoundError(f"Health database not found at {self.db_path}")
-            self.conn = duckdb.connect(str(self.db_path))
-            self.query_engine = HealthQueryEngine(self.conn)
-            logger.info(f"Connected to health database at {self.db_path}")
+        """Connect to the health database, once, however many tool calls ask at the same time."""
+        if self.conn is not None:
+            return
+        
+        async with self._connect_lock:
+            if self.conn is None:
+                if not self.db_path.exists():
+                    raise FileNotFoundError(f"Health database not found at {self.db_path}")
+                # The server only reads, and a read-only connection lets other
+                # read-only processes open the file at the same time. Opening
+                # can replay the WAL, so it runs off the event loop; the lock
+                # keeps calls arriving meanwhile from opening a second one.
+                config = dict(_CONNECTION_CONFIG)
+                if self.threads:
+                    config['threads'] = self.threads
+                loop = asyncio.get_running_loop()
+                conn = await loop.run_in_executor(
+                    None, lambda: duckdb.connect(str(self.db_path), read_only=True, config=config)
+                )
+                self.query_engine = HealthQueryEngine(conn, max_size=self.pool_size)
+                self._invalidate_caches()
+                self.conn = conn
+                logger.info(f"Connected to health database at {self.db_path}")
+    
+    def _invalidate_caches(self):
+        """Forget cached resource responses."""
+        # Each entry is (database file mtime, time built, JSON text)
+        self._schema_cache = None
+        self._summary_cache = None
+    
+    def _cached(self, entry: Optional[tuple], ttl: Optional[float] = None) -> Optional[str]:
+        """Return a cache entry's text if the database file is unchanged and it has not expired."""
+        if entry is None or entry[0] != self.db_path.stat().st_mtime:
+            return None
+        if ttl is not None and time.monotonic() - entry[1] > ttl:
+            return None
+        return entry[2]
+    
+    async def _fetchall(self, query: str, params: Optional[List] = None) -> List:
+        """Fetch all rows on one of the query engine's pooled cursors, off the event loop."""
+        return await self.query_engine.fetchall(query, params)
+    
+    async def _fetchone(self, query: str, params: Optional[List] = None) -> Optional[tuple]:
+        """Fetch the first row on one of the query engine's pooled cursors, off the event loop."""
+        return await self.query_engine.fetchone(query, params)
     
     async def _get_database_schema(self) -> str:
-        """Get the complete database schema."""
+        """Get the complete database schema, cached until the database file changes."""
         await self._connect_db()
         
+        # Agents re-read the resources on most turns, and the schema only
+        # changes when the file is rewritten
+        cached = self._cached(self._schema_cache)
+        if cached is not None:
+            return cached
+        mtime = self.db_path.stat().st_mtime
+        
         schema = {
             "tables": {},
             "description": "Personal health data extracted from C-CDA documents"
         }
         
         # Get all tables
-        tables = self.conn.execute("SHOW TABLES").fetchall()
+        tables = await self._fetchall("SHOW TABLES")
         
         for (table_name,) in tables:
             # Get table structure
-            columns = self.conn.execute(f"DESCRIBE {table_name}").fetchall()
+            columns = await self._fetchall(f"DESCRIBE {table_name}")
             schema["tables"][table_name] = {
                 "columns": [{"name": col[0], "type": col[1]} for col in columns],
                 "description": self._get_table_description(table_name)
             }
         
-        return json.dumps(schema, indent=2)
+        text = to_json(schema)
+        self._schema_cache = (mtime, time.monotonic(), text)
+        return text
     
     async def _get_database_summary(self) -> str:
-        """Get high-level database summary."""
+        """Get high-level database summary, cached for _SUMMARY_TTL seconds."""
         await self._connect_db()
         
+        cached = self._cached(self._summary_cache, _SUMMARY_TTL)
+        if cached is not None:
+            return cached
+        mtime = self.db_path.stat().st_mtime
+        
         summary = {
             "total_records": 0,
             "tables": {},
@@ -342,32 +577,47 @@ class HealthDataServer:
             "generated_at": datetime.now().isoformat()
         }
         
-        # Get record counts and date ranges for each table
-        table_queries = {
-            "medications": ("SELECT COUNT(*), MIN(start_date), MAX(start_date) FROM medications", "start_date"),
-            "results": ("SELECT COUNT(*), MIN(test_date), MAX(test_date) FROM results", "test_date"),
-            "vitals": ("SELECT COUNT(*), MIN(measurement_date), MAX(measurement_date) FROM vitals", "measurement_date"),
-            "problems": ("SELECT COUNT(*), MIN(onset_date), MAX(onset_date) FROM problems", "onset_date"),
-            "procedures": ("SELECT COUNT(*), MIN(procedure_date), MAX(procedure_date) FROM procedures", "procedure_date"),
-            "immunizations": ("SELECT COUNT(*), MIN(administration_date), MAX(administration_date) FROM immunizations", "administration_date")
+        # Date column giving each table's date range
+        date_columns = {
+            "medications": "start_date",
+            "results": "test_date",
+            "vitals": "measurement_date",
+            "problems": "onset_date",
+            "procedures": "procedure_date",
+            "immunizations": "administration_date"
         }
         
-        for table, (query, date_col) in table_queries.items():
-            try:
-                result = self.conn.execute(query).fetchone()
-                count, min_date, max_date = result
-                summary["tables"][table] = {
-                    "record_count": count,
-                    "date_range": {
-                        "earliest": str(min_date) if min_date else None,
-                        "latest": str(max_date) if max_date else None
-                    }
+        def summary_query(table: str) -> str:
+            date_col = date_columns[table]
+            return f"SELECT '{table}', COUNT(*), MIN({date_col}), MAX({date_col}) FROM {table}"
+        
+        # One statement for every table; the names are fixed above, not user input
+        try:
+            rows = await self._fetchall(" UNION ALL ".join(map(summary_query, date_columns)))
+            found = {row[0]: row[1:] for row in rows}
+            results = {table: found[table] for table in date_columns}
+        except Exception:
+            # A missing table fails the combined query; summarize the rest one by one
+            results = {}
+            for table in date_columns:
+                try:
+                    results[table] = (await self._fetchone(summary_query(table)))[1:]
+                except Exception as e:
+                    logger.warning(f"Could not get summary for table {table}: {e}")
+        
+        for table, (count, min_date, max_date) in results.items():
+            summary["tables"][table] = {
+                "record_count": count,
+                "date_range": {
+                    "earliest": min_date,
+                    "latest": max_date
                 }
-                summary["total_records"] += count
-            except Exception as e:
-                logger.warning(f"Could not get summary for table {table}: {e}")
+            }
+            summary["total_records"] += count
         
-        return json.dumps(summary, indent=2)
+        text = to_json(summary)
+        self._summary_cache = (mtime, time.monotonic(), text)
+        return text
     
     def _get_table_description(self, table_name: str) -> str:
         """Get human-readable description of table purpose."""
@@ -391,49 +641,28 @@ class HealthDataServer:
         """Get medication information."""
         await self._connect_db()
         
-        query = "SELECT medication_name, dosage, frequency, status, start_date, end_date, prescriber FROM medications"
         params = []
-        conditions = []
-        
         if status != "all":
-            conditions.append("LOWER(status) = ?")
             params.append(status.lower())
-        
         if medication_name:
-            conditions.append("LOWER(medication_name) LIKE ?")
-            params.append(f"%{medication_name.lower()}%")
-        
-        if conditions:
-            query += " WHERE " + " AND ".join(conditions)
-        
-        query += " ORDER BY start_date DESC LIMIT ?"
+            params.append(f"%{medication_name}%")
         params.append(limit)
         
-        results = self.conn.execute(query, params).fetchall()
+        query = _medications_sql(status != "all", bool(medication_name))
+        
+        results = await self._fetchall(query, params)
         
         if not results:
             return "No medications found matching the criteria."
         
-        # Format results
-        medications = []
-        for row in results:
-            med = {
-                "name": row[0],
-                "dosage": row[1] or "Not specified",
-                "frequency": row[2] or "Not specified",
-                "status": row[3],
-                "start_date": str(row[4]) if row[4] else None,
-                "end_date": str(row[5]) if row[5] else None,
-                "prescriber": row[6] or "Not specified"
-            }
-            medications.append(med)
+        medications = [row[0] for row in results]
         
-        return json.dumps({
+        return to_json({
             "total_found": len(medications),
             "medications": medications
-        }, indent=2)
+        })
     
-    async def _search_health_data(self, query: str, data_types: List[str] = None) -> str:
+    async def _search_health_data(self, query: str, data_types: List[str] = None, max_results: int = 30) -> str:
         """Search across health data using natural language query."""
         await self._connect_db()
         
@@ -446,162 +675,134 @@ class HealthDataServer:
         # Define search targets based on data_types or default to all
         targets = data_types or ["medications", "lab_results", "conditions", "procedures"]
         
-        query_lower = query.lower()
+        # ILIKE matches case-insensitively without lower-casing every row, and
+        # each match comes back as a STRUCT that DuckDB converts to the result dict.
+        # A full-text index would match whole words only ("met" no longer
+        # finds Metformin), needs the fts extension and a writable database,
+        # and a personal record has too few rows for the scan to matter.
+        pattern = f"%{query}%"
+        
+        # Each type returns at most 10 matches; once max_results are found the
+        # remaining types are not queried
+        def remaining() -> int:
+            return min(10, max_results - search_results["total_matches"])
         
         # Search medications
-        if "medications" in targets:
-            med_results = self.conn.execute("""
-                SELECT medication_name, status, start_date, prescriber
+        if "medications" in targets and remaining() > 0:
+            med_results = await self._fetchall("""
+                SELECT {'name': medication_name, 'status': status,
+                        'start_date': CAST(start_date AS VARCHAR), 'prescriber': prescriber}
                 FROM medications 
-                WHERE LOWER(medication_name) LIKE ? OR LOWER(instructions) LIKE ?
+                WHERE medication_name ILIKE ? OR instructions ILIKE ?
                 ORDER BY start_date DESC
-                LIMIT 10
-            """, [f"%{query_lower}%", f"%{query_lower}%"]).fetchall()
+                LIMIT ?
+            """, [pattern, pattern, remaining()])
             
             if med_results:
-                search_results["results"]["medications"] = [
-                    {
-                        "name": row[0],
-                        "status": row[1],
-                        "start_date": str(row[2]) if row[2] else None,
-                        "prescriber": row[3]
-                    }
-                    for row in med_results
-                ]
+                search_results["results"]["medications"] = [row[0] for row in med_results]
                 search_results["total_matches"] += len(med_results)
         
         # Search lab results
-        if "lab_results" in targets:
-            lab_results = self.conn.execute("""
-                SELECT test_name, test_date, result_value, unit, abnormal_flag
+        if "lab_results" in targets and remaining() > 0:
+            lab_results = await self._fetchall("""
+                SELECT {'test': test_name, 'date': CAST(test_date AS VARCHAR),
+                        'value': result_value, 'unit': unit,
+                        'abnormal': COALESCE(NULLIF(abnormal_flag, '') != 'Normal', false)}
                 FROM results 
-                WHERE LOWER(test_name) LIKE ? 
+                WHERE test_name ILIKE ? 
                 ORDER BY test_date DESC
-                LIMIT 10
-            """, [f"%{query_lower}%"]).fetchall()
+                LIMIT ?
+            """, [pattern, remaining()])
             
             if lab_results:
-                search_results["results"]["lab_results"] = [
-                    {
-                        "test": row[0],
-                        "date": str(row[1]) if row[1] else None,
-                        "value": row[2],
-                        "unit": row[3],
-                        "abnormal": row[4] != "Normal" if row[4] else False
-                    }
-                    for row in lab_results
-                ]
+                search_results["results"]["lab_results"] = [row[0] for row in lab_results]
                 search_results["total_matches"] += len(lab_results)
         
         # Search conditions
-        if "conditions" in targets:
-            condition_results = self.conn.execute("""
-                SELECT problem_name, status, onset_date, icd10_code
+        if "conditions" in targets and remaining() > 0:
+            condition_results = await self._fetchall("""
+                SELECT {'condition': problem_name, 'status': status,
+                        'onset_date': CAST(onset_date AS VARCHAR), 'icd10_code': icd10_code}
                 FROM problems 
-                WHERE LOWER(problem_name) LIKE ? OR LOWER(notes) LIKE ?
+                WHERE problem_name ILIKE ? OR notes ILIKE ?
                 ORDER BY onset_date DESC
-                LIMIT 10
-            """, [f"%{query_lower}%", f"%{query_lower}%"]).fetchall()
+                LIMIT ?
+            """, [pattern, pattern, remaining()])
             
             if condition_results:
-                search_results["results"]["conditions"] = [
-                    {
-                        "condition": row[0],
-                        "status": row[1],
-                        "onset_date": str(row[2]) if row[2] else None,
-                        "icd10_code": row[3]
-                    }
-                    for row in condition_results
-                ]
+                search_results["results"]["conditions"] = [row[0] for row in condition_results]
                 search_results["total_matches"] += len(condition_results)
         
         if search_results["total_matches"] == 0:
             return f"No health data found matching '{query}'"
         
-        return json.dumps(search_results, indent=2)
+        return to_json(search_results)
     
     async def _analyze_trends(self, metric_type: str, metric_name: str, 
-                             date_from: str = None, date_to: str = None) -> str:
-        """Analyze trends in health metrics over time."""
+                             date_from: str = None, date_to: str = None, bins: Optional[int] = None) -> str:
+        """Analyze trends in health metrics over time.
+        
+        Lab data lists every reading ({date, value, ...}) unless bins is set and
+        the series is longer than bins. Each data entry is then a date bin
+        {date_from, date_to, min, max, readings}, and a "binned" key is added.
+        """
+        if bins is not None and (not isinstance(bins, int) or isinstance(bins, bool) or bins < 1):
+            raise ValueError(f"bins must be a whole number of at least 1, got {bins!r}")
+        
         await self._connect_db()
         
         if metric_type == "lab_results":
-            query = """
-                SELECT test_date, result_value, unit, reference_range
-                FROM results 
-                WHERE LOWER(test_name) LIKE ?
-            """
-            params = [f"%{metric_name.lower()}%"]
-            
-            if date_from:
-                query += " AND test_date >= ?"
-                params.append(date_from)
-            if date_to:
-                query += " AND test_date <= ?"
-                params.append(date_to)
+            params = [f"%{metric_name}%"] + date_params(date_from, date_to)
             
-            query += " ORDER BY test_date ASC"
+            points_query, stats_query, binned_query = _lab_trend_sql(bool(date_from), bool(date_to))
+            stats = await self._fetchone(stats_query, params)
+            total, count, min_value, max_value, average, first, latest, first_date, latest_date = stats
             
-            results = self.conn.execute(query, params).fetchall()
-            
-            if not results:
+            if not total:
                 return f"No lab results found for {metric_name}"
             
-            # Process numeric values for trend analysis
-            data_points = []
-            for row in results:
-                try:
-                    value_str = str(row[1]).strip()
-                    if value_str and value_str.replace(".", "").replace("-", "").isdigit():
-                        data_points.append({
-                            "date": str(row[0]),
-                            "value": float(value_str),
-                            "unit": row[2] or "",
-                            "reference_range": row[3] or ""
-                        })
-                except (ValueError, TypeError):
-                    continue
-            
-            if len(data_points) < 2:
+            if count < 2:
                 return f"Insufficient numeric data for trend analysis of {metric_name}"
             
+            # Long series come back as one min/max entry per date bin
+            binned = bins is not None and count > bins
+            if binned:
+                points = await self._fetchall(binned_query, [bins] + params + [bins])
+            else:
+                points = await self._fetchall(points_query, params)
+            
             # Calculate trend statistics
-            values = [dp["value"] for dp in data_points]
+            change = latest - first
             trend_analysis = {
                 "metric": metric_name,
                 "metric_type": "lab_result",
-                "data_points": len(data_points),
+                "data_points": count,
                 "date_range": {
-                    "from": data_points[0]["date"],
-                    "to": data_points[-1]["date"]
+                    "from": first_date,
+                    "to": latest_date
                 },
                 "statistics": {
-                    "min": min(values),
-                    "max": max(values),
-                    "average": sum(values) / len(values),
-                    "latest": values[-1],
-                    "change": values[-1] - values[0],
-                    "percent_change": ((values[-1] - values[0]) / values[0] * 100) if values[0] != 0 else 0
+                    "min": min_value,
+                    "max": max_value,
+                    "average": average,
+                    "latest": latest,
+                    "change": change,
+                    "percent_change": (change / first * 100) if first != 0 else 0
                 },
-                "trend": "increasing" if values[-1] > values[0] else "decreasing" if values[-1] < values[0] else "stable",
-                "data": data_points
+                "trend": "increasing" if change > 0 else "decreasing" if change < 0 else "stable",
+                "data": [row[0] for row in points]
             }
+            if binned:
+                trend_analysis["binned"] = {"bins": len(points), "readings": count}
             
-            return json.dumps(trend_analysis, indent=2)
+            return to_json(trend_analysis)
         
         elif metric_type == "vitals":
             # Handle vital signs trends
-            vital_columns = {
-                "blood_pressure": ["systolic_bp", "diastolic_bp"],
-                "weight": ["weight_kg"],
-                "bmi": ["bmi"],
-                "heart_rate": ["heart_rate"]
-            }
-            
             metric_lower = metric_name.lower()
-            columns = []
+            columns = ()
             
-            for vital, cols in vital_columns.items():
+            for vital, cols in _VITAL_TREND_COLUMNS.items():
                 if vital in metric_lower:
                     columns = cols
                     break
@@ -609,23 +810,10 @@ class HealthDataServer:
             if not columns:
                 return f"Unknown vital metric: {metric_name}"
             
-            query = f"""
-                SELECT measurement_date, {', '.join(columns)}
-                FROM vitals 
-                WHERE {' IS NOT NULL OR '.join(columns)} IS NOT NULL
-            """
+            params = date_params(date_from, date_to)
+            query = _vital_trend_sql(columns, bool(date_from), bool(date_to))
             
-            params = []
-            if date_from:
-                query += " AND measurement_date >= ?"
-                params.append(date_from)
-            if date_to:
-                query += " AND measurement_date <= ?"
-                params.append(date_to)
-            
-            query += " ORDER BY measurement_date ASC"
-            
-            results = self.conn.execute(query, params).fetchall()
+            results = await self._fetchall(query, params)
             
             if not results:
                 return f"No vital signs data found for {metric_name}"
@@ -633,7 +821,7 @@ class HealthDataServer:
             # Process results for trend analysis
             data_points = []
             for row in results:
-                point = {"date": str(row[0])}
+                point = {"date": row[0]}
                 for i, col in enumerate(columns):
                     if row[i + 1] is not None:
                         point[col] = row[i + 1]
@@ -641,140 +829,56 @@ class HealthDataServer:
                 if len(point) > 1:  # Has date and at least one value
                     data_points.append(point)
             
-            return json.dumps({
+            return to_json({
                 "metric": metric_name,
                 "metric_type": "vital_signs",
                 "data_points": len(data_points),
                 "data": data_points
-            }, indent=2)
+            })
         
         else:
             return f"Trend analysis not supported for metric type: {metric_type}"
     
     async def _get_health_timeline(self, date_from: str = None, date_to: str = None, 
-                                  event_types: List[str] = None) -> str:
-        """Get chronological timeline of health events."""
-        await self._connect_db()
+                                  event_types: List[str] = None, limit: Optional[int] = None) -> str:
+        """Get chronological timeline of health events.
         
-        timeline_events = []
+        With a limit only the most recent events are returned; total_events
+        still counts every match and truncated says whether any were dropped.
+        """
+        await self._connect_db()
         
         # Default to all event types if none specified
         if not event_types:
             event_types = ["medications", "procedures", "lab_results", "conditions", "immunizations"]
         
-        # Collect events from different tables
-        if "medications" in event_types:
-            med_query = """
-                SELECT 'medication' as event_type, medication_name as description, 
-                       start_date as event_date, status, prescriber as provider
-                FROM medications 
-                WHERE start_date IS NOT NULL
-            """
-            params = []
-            if date_from:
-                med_query += " AND start_date >= ?"
-                params.append(date_from)
-            if date_to:
-                med_query += " AND start_date <= ?"
-                params.append(date_to)
-            
-            med_results = self.conn.execute(med_query, params).fetchall()
-            for row in med_results:
-                timeline_events.append({
-                    "type": row[0],
-                    "description": f"Started {row[1]}",
-                    "date": str(row[2]),
-                    "status": row[3],
-                    "provider": row[4]
-                })
-        
-        if "procedures" in event_types:
-            proc_query = """
-                SELECT 'procedure' as event_type, procedure_name as description,
-                       procedure_date as event_date, status, provider
-                FROM procedures 
-                WHERE procedure_date IS NOT NULL
-            """
-            params = []
-            if date_from:
-                proc_query += " AND procedure_date >= ?"
-                params.append(date_from)
-            if date_to:
-                proc_query += " AND procedure_date <= ?"
-                params.append(date_to)
-            
-            proc_results = self.conn.execute(proc_query, params).fetchall()
-            for row in proc_results:
-                timeline_events.append({
-                    "type": row[0],
-                    "description": row[1],
-                    "date": str(row[2]),
-                    "status": row[3],
-                    "provider": row[4]
-                })
-        
-        if "conditions" in event_types:
-            cond_query = """
-                SELECT 'condition' as event_type, problem_name as description,
-                       onset_date as event_date, status, NULL as provider
-                FROM problems 
-                WHERE onset_date IS NOT NULL
-            """
-            params = []
-            if date_from:
-                cond_query += " AND onset_date >= ?"
-                params.append(date_from)
-            if date_to:
-                cond_query += " AND onset_date <= ?"
-                params.append(date_to)
-            
-            cond_results = self.conn.execute(cond_query, params).fetchall()
-            for row in cond_results:
-                timeline_events.append({
-                    "type": row[0],
-                    "description": f"Diagnosed with {row[1]}",
-                    "date": str(row[2]),
-                    "status": row[3],
-                    "provider": row[4]
-                })
-        
-        if "immunizations" in event_types:
-            imm_query = """
-                SELECT 'immunization' as event_type, vaccine_name as description,
-                       administration_date as event_date, NULL as status, provider
-                FROM immunizations 
-                WHERE administration_date IS NOT NULL
-            """
-            params = []
-            if date_from:
-                imm_query += " AND administration_date >= ?"
-                params.append(date_from)
-            if date_to:
-                imm_query += " AND administration_date <= ?"
-                params.append(date_to)
-            
-            imm_results = self.conn.execute(imm_query, params).fetchall()
-            for row in imm_results:
-                timeline_events.append({
-                    "type": row[0],
-                    "description": f"Received {row[1]}",
-                    "date": str(row[2]),
-                    "status": row[3],
-                    "provider": row[4]
-                })
-        
-        # Sort timeline by date
-        timeline_events.sort(key=lambda x: x["date"], reverse=True)
-        
-        return json.dumps({
-            "total_events": len(timeline_events),
+        # Every requested event type is one branch of a single UNION ALL
+        # query, sorted newest first in SQL
+        kinds = tuple(kind for kind in _TIMELINE_EVENTS if kind in event_types)
+        timeline_events = []
+        total_events = 0
+        if kinds:
+            params = date_params(date_from, date_to) * len(kinds)
+            if limit is not None:
+                # Fetch at least one row so the total is known even for limit 0
+                params.append(max(limit, 1))
+            results = await self._fetchall(_timeline_sql(kinds, bool(date_from), bool(date_to), limit is not None),
+                                           params)
+            timeline_events = [row[0] for row in results]
+            if limit is not None:
+                timeline_events = timeline_events[:max(limit, 0)]
+            total_events = results[0][1] if limit is not None and results else len(timeline_events)
+        
+        return to_json({
+            "total_events": total_events,
+            "truncated": total_events > len(timeline_events),
             "date_range": {
                 "from": date_from,
                 "to": date_to
             },
             "event_types": event_types,
             "timeline": timeline_events
-        }, indent=2)
+        })
 
 async def main():
     """Main entry point for the MCP server."""
@@ -786,9 +890,21 @@ async def main():
         default="/Users/Shared/health_data.duckdb", 
         help="Path to health database file"
     )
+    parser.add_argument(
+        "--pool-size",
+        type=int,
+        default=5,
+        help="Maximum number of queries run at once (default: 5)"
+    )
+    parser.add_argument(
+        "--threads",
+        type=int,
+        default=None,
+        help="Number of DuckDB worker threads (default: all cores)"
+    )
     args = parser.parse_args()
     
-    server = HealthDataServer(args.db_path)
+    server = HealthDataServer(args.db_path, pool_size=args.pool_size, threads=args.threads)
     
     # Run the server using stdio transport
     from mcp.server.stdio import stdio_server
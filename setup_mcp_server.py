@@ -71,23 +71,25 @@ async def test_mcp_server(db_path):
         await server._connect_db()
         print("  ✅ Server connection successful")
         
-        # Test medications query
-        result = await server._get_medications(limit=3)
-        med_data = json.loads(result)
+        # The probes are independent and each runs on its own pooled cursor,
+        # so issue them together: medications, lab results, health summary
+        # and database schema
+        med_result, lab_result, summary_result, schema = await asyncio.gather(
+            server._get_medications(limit=3),
+            server.query_engine.get_lab_results(limit=3),
+            server.query_engine.get_health_summary(),
+            server._get_database_schema()
+        )
+        
+        med_data = json.loads(med_result)
         print(f"  ✅ Medications test: Found {med_data['total_found']} medications")
         
-        # Test lab results query
-        result = await server.query_engine.get_lab_results(limit=3)
-        lab_data = json.loads(result)
+        lab_data = json.loads(lab_result)
         print(f"  ✅ Lab results test: Found {lab_data['total_found']} results")
         
-        # Test health summary
-        result = await server.query_engine.get_health_summary()
-        summary_data = json.loads(result)
+        summary_data = json.loads(summary_result)
         print(f"  ✅ Health summary test: Generated summary with {len(summary_data)} sections")
         
-        # Test database schema
-        schema = await server._get_database_schema()
         schema_data = json.loads(schema)
         print(f"  ✅ Schema test: Found {len(schema_data['tables'])} tables")
         
@@ -119,12 +121,13 @@ def generate_claude_config(db_path):
     print("📍 Config file locations:")
     print("  macOS: ~/Library/Application Support/Claude/claude_desktop_config.json")
     print("  Windows: %APPDATA%/Claude/claude_desktop_config.json")
+    # Encode once for both the printout and the saved file
+    config_json = json.dumps(config, indent=2)
     print("\n📋 Configuration to add:")
-    print(json.dumps(config, indent=2))
+    print(config_json)
     
     # Save to file
-    with open("claude_desktop_config.json", "w") as f:
-        json.dump(config, f, indent=2)
+    Path("claude_desktop_config.json").write_text(config_json)
     
     print(f"\n💾 Configuration saved to: claude_desktop_config.json")
 
@@ -1,90 +1,233 @@
+import duckdb
 import pandas as pd
-from typing import Dict
+from typing import Dict, Optional
 import logging
-from database import HealthDatabase
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from database import HealthDatabase, SCHEMA, clear_table
+
+try:
+    import pyarrow as pa
+except ImportError:  # optional; sections are appended straight from the DataFrame
+    pa = None
 
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Transformed data sections and the tables they load into
+_TABLE_MAPPINGS = {
+    'medications': 'medications',
+    'allergies': 'allergies',
+    'problems': 'problems',
+    'procedures': 'procedures',
+    'results': 'results',
+    'vitals': 'vitals',
+    'immunizations': 'immunizations'
+}
+
+# Columns loaded into each table, in table order; id comes from the table's sequence
+_TABLE_COLUMNS = {
+    table: [column for column, _ in SCHEMA[table] if column != 'id']
+    for table in _TABLE_MAPPINGS.values()
+}
+
+# Date column each table is stored in order of; these are the columns the
+# timeline and trend queries filter by date range
+_SORT_COLUMNS = {
+    'medications': 'start_date',
+    'problems': 'onset_date',
+    'procedures': 'procedure_date',
+    'results': 'test_date',
+    'vitals': 'measurement_date',
+    'immunizations': 'administration_date'
+}
+
+# Vitals measurements that must load as NULL rather than empty strings
+_NUMERIC_COLUMNS = ['height_cm', 'weight_kg', 'bmi', 'systolic_bp', 'diastolic_bp',
+                    'heart_rate', 'temperature_c', 'respiratory_rate', 'oxygen_saturation']
+
+# Date and numeric columns of each table whose empty strings load as NULL
+_COERCE_COLUMNS = {
+    table: [col for col in columns if 'date' in col.lower() or col in _NUMERIC_COLUMNS]
+    for table, columns in _TABLE_COLUMNS.items()
+}
+
 class SimpleDataLoader:
     """Load transformed health data into DuckDB using pandas."""
     
-    def __init__(self, db_path: str = "/Users/Shared/health_data.duckdb"):
-        self.db = HealthDatabase(db_path)
-        self.conn = self.db.get_connection()
+    def __init__(self, db_path: str = "/Users/Shared/health_data.duckdb", threads: Optional[int] = None,
+                 conn: Optional[duckdb.DuckDBPyConnection] = None, memory_limit: Optional[str] = None):
+        """Open db_path, or load through an existing connection when conn is given.
+        
+        A shared connection stays owned by the caller and is not closed here.
+        """
+        if conn is not None:
+            self.db = None
+            self.conn = conn
+        else:
+            self.db = HealthDatabase(db_path, threads=threads, memory_limit=memory_limit)
+            self.conn = self.db.get_connection()
+        self._in_transaction = False
+        # created_at shared by every table in the current load, if one is running
+        self._loaded_at = None
+    
+    @contextmanager
+    def transaction(self):
+        """Run load_section calls as one transaction on the loader's connection."""
+        self.conn.execute("BEGIN TRANSACTION")
+        self._in_transaction = True
+        self._loaded_at = pd.Timestamp.now()
+        try:
+            yield
+            self.conn.execute("COMMIT")
+        except Exception:
+            self.conn.execute("ROLLBACK")
+            raise
+        finally:
+            self._in_transaction = False
+            self._loaded_at = None
     
     def _get_table_schemas(self) -> Dict[str, list]:
-        """Get the column names for each table."""
-        return {
-            'medications': ['id', 'medication_name', 'dosage', 'frequency', 'route', 'start_date', 'end_date', 'status', 'prescriber', 'ndc_code', 'rxnorm_code', 'instructions', 'created_at'],
-            'allergies': ['id', 'allergen', 'reaction', 'severity', 'onset_date', 'status', 'allergy_code', 'notes', 'created_at'],
-            'problems': ['id', 'problem_name', 'icd10_code', 'snomed_code', 'onset_date', 'resolution_date', 'status', 'severity', 'notes', 'created_at'],
-            'procedures': ['id', 'procedure_name', 'procedure_date', 'cpt_code', 'snomed_code', 'provider', 'location', 'status', 'notes', 'created_at'],
-            'results': ['id', 'test_name', 'test_date', 'result_value', 'unit', 'reference_range', 'abnormal_flag', 'status', 'loinc_code', 'provider', 'notes', 'created_at'],
-            'vitals': ['id', 'measurement_date', 'measurement_time', 'height_cm', 'weight_kg', 'bmi', 'systolic_bp', 'diastolic_bp', 'heart_rate', 'temperature_c', 'respiratory_rate', 'oxygen_saturation', 'notes', 'created_at'],
-            'immunizations': ['id', 'vaccine_name', 'administration_date', 'lot_number', 'manufacturer', 'route', 'site', 'cvx_code', 'provider', 'notes', 'created_at']
-        }
+        """Get the column names loaded into each table."""
+        return _TABLE_COLUMNS
+    
+    def _insert_select(self, conn, table_name: str, df: pd.DataFrame, source=None):
+        """Insert a DataFrame through a registered view, matching columns by name.
+        
+        source, when given, is registered in place of df (e.g. an Arrow table built from it).
+        """
+        # created_at comes from the frame too, so tables loaded together keep
+        # the shared timestamp _prepare_frame set
+        column_list = ', '.join(df.columns)
+        view_name = f"{table_name}_df"
+        
+        conn.register(view_name, df if source is None else source)
+        try:
+            conn.execute(
+                f"INSERT INTO {table_name} ({column_list}) "
+                f"SELECT {column_list} FROM {view_name}"
+            )
+        finally:
+            conn.unregister(view_name)
+    
+    def _prepare_frame(self, table_name: str, df: pd.DataFrame) -> pd.DataFrame:
+        """Shape a transformed DataFrame to match its table's columns.
+        
+        Every step returns a new frame, so the caller's DataFrame is never
+        modified and does not need to be copied up front.
+        """
+        # Store rows in date order so each row group's min/max
+        # zonemap covers a narrow date range and date filters can skip it
+        sort_column = _SORT_COLUMNS.get(table_name)
+        if sort_column in df.columns:
+            df = df.sort_values(sort_column, kind='stable', na_position='last', ignore_index=True)
+        
+        # Add created_at timestamp; tables loaded together share one
+        df = df.assign(created_at=self._loaded_at if self._loaded_at is not None else pd.Timestamp.now())
+        
+        # Add any missing columns as NULLs and put them in table order in one pass
+        expected_columns = self._get_table_schemas().get(table_name, [])
+        df = df.reindex(columns=expected_columns)
+        
+        # Replace empty strings with None for date and numeric columns in one
+        # frame-wide pass rather than one Series replace per column
+        coerce_columns = _COERCE_COLUMNS.get(table_name, [])
+        if coerce_columns:
+            df[coerce_columns] = df[coerce_columns].replace({'': None})
+        
+        return df
+    
+    def _replace_table(self, conn, data_type: str, table_name: str, df: pd.DataFrame) -> int:
+        """Prepare a section and replace its table's contents on the given connection."""
+        df = self._prepare_frame(table_name, df)
+        
+        # Clear existing data; outside transaction() the DELETE and the id
+        # sequence restart still commit together
+        if self._in_transaction:
+            clear_table(conn, table_name)
+        else:
+            conn.execute("BEGIN TRANSACTION")
+            try:
+                clear_table(conn, table_name)
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        
+        # Insert the frame in one statement, matching columns by name so id is
+        # filled from the table's sequence.
+        # DuckDB scans the DataFrame's columns directly, so staging it as
+        # Parquet first would only add a disk round trip (and a hard pyarrow
+        # dependency) in front of the same vectorized insert.
+        try:
+            if pa is not None:
+                # Arrow tables are scanned straight from their buffers, without
+                # boxing each string as a Python object; use them when installed
+                self._insert_select(conn, table_name, df, pa.Table.from_pandas(df, preserve_index=False))
+            else:
+                conn.append(table_name, df, by_name=True)
+        except duckdb.Error as e:
+            # A failed statement aborts an open transaction, so there is
+            # nothing to fall back to; let the caller roll back
+            if self._in_transaction:
+                raise
+            logger.warning(f"Bulk insert into {table_name} failed, inserting by column name: {e}")
+            self._insert_select(conn, table_name, df)
+        
+        logger.info(f"Loaded {len(df)} {data_type} records")
+        return len(df)
+    
+    def _load_section(self, data_type: str, table_name: str, df: pd.DataFrame) -> int:
+        """Prepare and load one section on its own cursor."""
+        # Each worker thread gets its own cursor; DuckDB handles concurrent
+        # writers to different tables.
+        cursor = self.conn.cursor()
+        try:
+            return self._replace_table(cursor, data_type, table_name, df)
+        except Exception as e:
+            logger.error(f"Error loading {data_type}: {e}")
+            return 0
+        finally:
+            cursor.close()
+    
+    def load_section(self, data_type: str, df: pd.DataFrame) -> int:
+        """Load a single transformed section, replacing its table's contents.
+        
+        Inside transaction() errors are raised so the whole load rolls back.
+        """
+        if df.empty:
+            logger.info(f"No {data_type} data to load")
+            return 0
+        
+        table_name = _TABLE_MAPPINGS[data_type]
+        if self._in_transaction:
+            return self._replace_table(self.conn, data_type, table_name, df)
+        return self._load_section(data_type, table_name, df)
     
     def load_all_data(self, transformed_data: Dict[str, pd.DataFrame]) -> Dict[str, int]:
-        """Load all transformed data into database using pandas."""
+        """Load all transformed data into database using pandas, one thread per section."""
         load_results = {}
         
-        # Define table mappings
-        table_mappings = {
-            'medications': 'medications',
-            'allergies': 'allergies', 
-            'problems': 'problems',
-            'procedures': 'procedures',
-            'results': 'results',
-            'vitals': 'vitals',
-            'immunizations': 'immunizations'
+        sections = {
+            data_type: table_name for data_type, table_name in _TABLE_MAPPINGS.items()
+            if data_type in transformed_data and not transformed_data[data_type].empty
         }
         
-        # Get table schemas
-        table_schemas = self._get_table_schemas()
-        
-        for data_type, table_name in table_mappings.items():
-            if data_type in transformed_data and not transformed_data[data_type].empty:
-                df = transformed_data[data_type].copy()
-                
-                # Add ID column
-                df.insert(0, 'id', range(1, len(df) + 1))
-                
-                # Add created_at timestamp
-                df['created_at'] = pd.Timestamp.now()
-                
-                # Ensure all required columns exist
-                expected_columns = table_schemas.get(table_name, [])
-                for col in expected_columns:
-                    if col not in df.columns:
-                        df[col] = None
-                
-                # Reorder columns to match table schema
-                df = df[expected_columns]
-                
-                # Replace empty strings with None for date and numeric columns
-                date_columns = [col for col in df.columns if 'date' in col.lower()]
-                numeric_columns = ['height_cm', 'weight_kg', 'bmi', 'systolic_bp', 'diastolic_bp', 
-                                 'heart_rate', 'temperature_c', 'respiratory_rate', 'oxygen_saturation']
-                
-                for col in date_columns + numeric_columns:
-                    if col in df.columns:
-                        df[col] = df[col].replace('', None)
-                
-                try:
-                    # Clear existing data
-                    self.conn.execute(f"DELETE FROM {table_name}")
-                    
-                    # Insert new data using pandas
-                    self.conn.register('temp_df', df)
-                    self.conn.execute(f"INSERT INTO {table_name} SELECT * FROM temp_df")
-                    
-                    load_results[data_type] = len(df)
-                    logger.info(f"Loaded {len(df)} {data_type} records")
-                    
-                except Exception as e:
-                    logger.error(f"Error loading {data_type}: {e}")
-                    load_results[data_type] = 0
+        futures = {}
+        if sections:
+            self._loaded_at = pd.Timestamp.now()
+            try:
+                with ThreadPoolExecutor(max_workers=min(8, len(sections))) as executor:
+                    futures = {
+                        data_type: executor.submit(self._load_section, data_type, table_name, transformed_data[data_type])
+                        for data_type, table_name in sections.items()
+                    }
+            finally:
+                self._loaded_at = None
+        
+        # The executor has waited for every load; report in table order
+        for data_type in _TABLE_MAPPINGS:
+            if data_type in futures:
+                load_results[data_type] = futures[data_type].result()
             else:
                 load_results[data_type] = 0
                 logger.info(f"No {data_type} data to load")
@@ -93,18 +236,17 @@ class SimpleDataLoader:
     
     def get_table_counts(self) -> Dict[str, int]:
         """Get record counts for all tables."""
-        tables = ['medications', 'allergies', 'problems', 'procedures', 'results', 'vitals', 'immunizations']
-        counts = {}
+        tables = list(_TABLE_MAPPINGS.values())
         
-        for table in tables:
-            try:
-                result = self.conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()
-                counts[table] = result[0] if result else 0
-            except Exception as e:
-                logger.error(f"Error getting count for {table}: {e}")
-                counts[table] = 0
+        # One statement with a scalar subquery per table instead of one query each
+        query = "SELECT " + ", ".join(f"(SELECT COUNT(*) FROM {table})" for table in tables)
+        try:
+            result = self.conn.execute(query).fetchone()
+        except Exception as e:
+            logger.error(f"Error getting table counts: {e}")
+            return {table: 0 for table in tables}
         
-        return counts
+        return dict(zip(tables, result))
     
     def close(self):
         """Close database connection."""
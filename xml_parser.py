@@ -1,31 +1,173 @@
 from lxml import etree
-from typing import Dict, List, Optional, Any
+from typing import Dict, List, Optional, Any, Iterator, Tuple
 import logging
-from datetime import datetime
-import re
+from datetime import date, time
+from functools import lru_cache
 
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# C-CDA XML namespaces
+_NAMESPACES = {
+    'hl7': 'urn:hl7-org:v3',
+    'xsi': 'http://www.w3.org/2001/XMLSchema-instance',
+    'sdtc': 'urn:hl7-org:sdtc'
+}
+
+def _xpath(expression: str) -> etree.XPath:
+    """Compile an XPath expression against the C-CDA namespaces."""
+    return etree.XPath(expression, namespaces=_NAMESPACES)
+
+def _hl7(name: str) -> str:
+    """Clark-notation tag for an element in the HL7 v3 namespace."""
+    return f"{{{_NAMESPACES['hl7']}}}{name}"
+
+# XPath expressions used to locate sections, compiled once at import
+_XP_SECTIONS = _xpath("//hl7:section")
+_XP_TITLE_TEXT = _xpath("hl7:title/text()")
+
+# Element tags looked up inside entries. Descendant searches by tag run in
+# lxml's C iterators and skip the XPath engine entirely.
+_TAG_SECTION = _hl7('section')
+_TAG_SUBSTANCE_ADMINISTRATION = _hl7('substanceAdministration')
+_TAG_OBSERVATION = _hl7('observation')
+_TAG_PROCEDURE = _hl7('procedure')
+_TAG_NAME = _hl7('name')
+_TAG_DOSE_QUANTITY = _hl7('doseQuantity')
+_TAG_ROUTE_CODE = _hl7('routeCode')
+_TAG_EFFECTIVE_TIME = _hl7('effectiveTime')
+_TAG_LOW = _hl7('low')
+_TAG_HIGH = _hl7('high')
+_TAG_STATUS_CODE = _hl7('statusCode')
+_TAG_VALUE = _hl7('value')
+_TAG_CODE = _hl7('code')
+_TAG_ENTRY_RELATIONSHIP = _hl7('entryRelationship')
+_TAG_REFERENCE_RANGE = _hl7('referenceRange')
+_TAG_TEXT = _hl7('text')
+
+def _first(element, tag: str):
+    """First descendant of element with tag, in document order, or None."""
+    return next(element.iterdescendants(tag), None)
+
+def _first_within(element, outer_tag: str, tag: str, type_code: Optional[str] = None):
+    """First tag element inside any outer_tag descendant of element, or None.
+    
+    Matches .//outer_tag//tag in document order, optionally only under
+    outer elements with the given typeCode.
+    """
+    for outer in element.iterdescendants(outer_tag):
+        if type_code is None or outer.get('typeCode') == type_code:
+            inner = _first(outer, tag)
+            if inner is not None:
+                return inner
+    return None
+
+# Section titles the parser understands, mapped to their parsed data keys
+_SECTION_TITLES = {
+    'Medications': 'medications',
+    'Allergies': 'allergies',
+    'Problems': 'problems',
+    'Procedures': 'procedures',
+    'Results': 'results',
+    'Vitals': 'vitals',
+    'Immunizations': 'immunizations',
+}
+
+# Parsed section names, in the order parse_all_sections returns them
+SECTIONS = tuple(_SECTION_TITLES.values())
+
+# Parser settings for both whole-document and streaming reads. Extraction
+# needs no xml:id index, whitespace-only text nodes, comments or custom
+# entity expansion, so the DOM is built without them.
+_PARSER_OPTIONS = {
+    'collect_ids': False,
+    'remove_blank_text': True,
+    'remove_comments': True,
+    'resolve_entities': False,
+}
+
+# Vitals fields for the LOINC codes vital sign observations carry
+_VITAL_FIELDS_BY_LOINC = {
+    '8302-2': 'height_cm',
+    '8306-3': 'height_cm',
+    '29463-7': 'weight_kg',
+    '3141-9': 'weight_kg',
+    '39156-5': 'bmi',
+    '8480-6': 'systolic_bp',
+    '8462-4': 'diastolic_bp',
+    '8867-4': 'heart_rate',
+    '8310-5': 'temperature_c',
+    '9279-1': 'respiratory_rate',
+    '2708-6': 'oxygen_saturation',
+    '59408-5': 'oxygen_saturation',
+}
+
+def _vital_field_from_name(display_name: str) -> Optional[str]:
+    """Vitals field for an observation without a known LOINC code, by display name."""
+    vital_type = display_name.lower()
+    
+    if 'height' in vital_type:
+        return 'height_cm'
+    elif 'weight' in vital_type:
+        return 'weight_kg'
+    elif 'blood pressure' in vital_type or 'systolic' in vital_type:
+        return 'systolic_bp'
+    elif 'diastolic' in vital_type:
+        return 'diastolic_bp'
+    elif 'heart rate' in vital_type or 'pulse' in vital_type:
+        return 'heart_rate'
+    elif 'temperature' in vital_type:
+        return 'temperature_c'
+    return None
+
+@lru_cache(maxsize=8192)
+def _parse_date(date_str: str) -> str:
+    """Normalize a non-empty HL7 date; the same timestamps recur across entries."""
+    # Remove a trailing +HHMM/-HHMM timezone offset
+    if len(date_str) >= 5 and date_str[-5] in '+-' and date_str[-4:].isdigit():
+        date_str = date_str[:-5]
+    
+    # YYYYMMDD or YYYYMMDDHHMMSS; the fields are fixed width, so slice them
+    # rather than running strptime's format parser, and let date()/time()
+    # reject out-of-range values
+    if len(date_str) == 8 or len(date_str) >= 14:
+        digits = date_str[:8] if len(date_str) == 8 else date_str[:14]
+        if digits.isdigit():
+            try:
+                parsed_date = date(int(digits[:4]), int(digits[4:6]), int(digits[6:8]))
+                if len(digits) == 14:
+                    time(int(digits[8:10]), int(digits[10:12]), int(digits[12:14]))
+                return parsed_date.isoformat()
+            except ValueError:
+                pass
+    
+    return date_str
+
 class CCDAParser:
     """Parser for C-CDA XML documents."""
     
-    def __init__(self, xml_file_path: str):
+    def __init__(self, xml_file_path: str, load_tree: bool = True,
+                 tree: Optional[etree._ElementTree] = None):
+        """Open a C-CDA document.
+        
+        With load_tree=False the document is not read up front; use stream()
+        or parse_all_sections() to read it incrementally instead. A caller
+        that already holds the parsed document can pass it as tree to skip
+        parsing the file again.
+        """
         self.xml_file_path = xml_file_path
-        self.tree = None
-        self.root = None
-        self.namespaces = {
-            'hl7': 'urn:hl7-org:v3',
-            'xsi': 'http://www.w3.org/2001/XMLSchema-instance',
-            'sdtc': 'urn:hl7-org:sdtc'
-        }
-        self.parse_document()
+        self.tree = tree
+        self.root = tree.getroot() if tree is not None else None
+        self.namespaces = _NAMESPACES
+        self._sections_by_title = None
+        if load_tree and tree is None:
+            self.parse_document()
     
     def parse_document(self):
         """Parse the XML document."""
         try:
-            self.tree = etree.parse(self.xml_file_path)
+            self.tree = etree.parse(self.xml_file_path, etree.XMLParser(**_PARSER_OPTIONS))
             self.root = self.tree.getroot()
+            self._sections_by_title = None
             logger.info(f"Successfully parsed XML document: {self.xml_file_path}")
         except Exception as e:
             logger.error(f"Error parsing XML document: {e}")
@@ -36,30 +178,17 @@ class CCDAParser:
         if not date_str:
             return None
         
-        # Remove timezone info and normalize
-        date_str = re.sub(r'[-+]\d{4}$', '', date_str)
-        
-        if len(date_str) == 8:  # YYYYMMDD
-            try:
-                parsed_date = datetime.strptime(date_str, '%Y%m%d')
-                return parsed_date.strftime('%Y-%m-%d')
-            except ValueError:
-                pass
-        
-        if len(date_str) >= 14:  # YYYYMMDDHHMMSS
-            try:
-                parsed_date = datetime.strptime(date_str[:14], '%Y%m%d%H%M%S')
-                return parsed_date.strftime('%Y-%m-%d')
-            except ValueError:
-                pass
-        
-        return date_str
+        return _parse_date(date_str)
     
     def get_text_content(self, element) -> str:
         """Extract text content from element, handling nested elements."""
         if element is None:
             return ""
         
+        # Most elements hold a single text node; skip building the parts list
+        if len(element) == 0:
+            return (element.text or "").strip()
+        
         text_parts = []
         if element.text:
             text_parts.append(element.text.strip())
@@ -74,304 +203,369 @@ class CCDAParser:
     
     def find_section_by_title(self, title: str):
         """Find a section by its title."""
-        sections = self.root.xpath(f"//hl7:section[hl7:title[text()='{title}']]", namespaces=self.namespaces)
-        return sections[0] if sections else None
+        # Index every section by title in one pass over the tree, rather than
+        # scanning the whole document again for each title looked up
+        if self._sections_by_title is None:
+            self._sections_by_title = {}
+            for section in _XP_SECTIONS(self.root):
+                for section_title in _XP_TITLE_TEXT(section):
+                    self._sections_by_title.setdefault(section_title, section)
+        
+        return self._sections_by_title.get(title)
     
     def parse_medications(self) -> List[Dict[str, Any]]:
         """Parse medications section."""
-        medications = []
         section = self.find_section_by_title("Medications")
         
         if section is None:
             logger.warning("Medications section not found")
-            return medications
+            return []
         
-        entries = section.xpath(".//hl7:substanceAdministration", namespaces=self.namespaces)
+        return self._extract_medications(section)
+    
+    def _extract_medications(self, section) -> List[Dict[str, Any]]:
+        """Extract records from a Medications section element."""
+        medications = []
+        
+        entries = section.iterdescendants(_TAG_SUBSTANCE_ADMINISTRATION)
         
         for entry in entries:
             med_data = {}
             
             # Medication name
-            med_name_elem = entry.xpath(".//hl7:name", namespaces=self.namespaces)
-            if med_name_elem:
-                med_data['medication_name'] = self.get_text_content(med_name_elem[0])
+            med_name_elem = _first(entry, _TAG_NAME)
+            if med_name_elem is not None:
+                med_data['medication_name'] = self.get_text_content(med_name_elem)
             
             # Dosage and frequency
-            dose_elem = entry.xpath(".//hl7:doseQuantity", namespaces=self.namespaces)
-            if dose_elem:
-                med_data['dosage'] = dose_elem[0].get('value', '')
+            dose_elem = _first(entry, _TAG_DOSE_QUANTITY)
+            if dose_elem is not None:
+                med_data['dosage'] = dose_elem.get('value', '')
             
             # Route
-            route_elem = entry.xpath(".//hl7:routeCode", namespaces=self.namespaces)
-            if route_elem:
-                med_data['route'] = route_elem[0].get('displayName', '')
+            route_elem = _first(entry, _TAG_ROUTE_CODE)
+            if route_elem is not None:
+                med_data['route'] = route_elem.get('displayName', '')
             
             # Start and end dates
-            effective_time = entry.xpath(".//hl7:effectiveTime", namespaces=self.namespaces)
-            for time_elem in effective_time:
-                low_elem = time_elem.xpath(".//hl7:low", namespaces=self.namespaces)
-                if low_elem:
-                    med_data['start_date'] = self.parse_date(low_elem[0].get('value'))
+            for time_elem in entry.iterdescendants(_TAG_EFFECTIVE_TIME):
+                low_elem = _first(time_elem, _TAG_LOW)
+                if low_elem is not None:
+                    med_data['start_date'] = self.parse_date(low_elem.get('value'))
                 
-                high_elem = time_elem.xpath(".//hl7:high", namespaces=self.namespaces)
-                if high_elem:
-                    med_data['end_date'] = self.parse_date(high_elem[0].get('value'))
+                high_elem = _first(time_elem, _TAG_HIGH)
+                if high_elem is not None:
+                    med_data['end_date'] = self.parse_date(high_elem.get('value'))
             
             # Status
-            status_elem = entry.xpath(".//hl7:statusCode", namespaces=self.namespaces)
-            if status_elem:
-                med_data['status'] = status_elem[0].get('code', '')
+            status_elem = _first(entry, _TAG_STATUS_CODE)
+            if status_elem is not None:
+                med_data['status'] = status_elem.get('code', '')
             
             if med_data:
                 medications.append(med_data)
         
-        logger.info(f"Parsed {len(medications)} medications")
         return medications
     
     def parse_allergies(self) -> List[Dict[str, Any]]:
         """Parse allergies section."""
-        allergies = []
         section = self.find_section_by_title("Allergies")
         
         if section is None:
             logger.warning("Allergies section not found")
-            return allergies
+            return []
         
-        entries = section.xpath(".//hl7:observation", namespaces=self.namespaces)
+        return self._extract_allergies(section)
+    
+    def _extract_allergies(self, section) -> List[Dict[str, Any]]:
+        """Extract records from a Allergies section element."""
+        allergies = []
+        
+        entries = section.iterdescendants(_TAG_OBSERVATION)
         
         for entry in entries:
             allergy_data = {}
             
             # Allergen name
-            value_elem = entry.xpath(".//hl7:value", namespaces=self.namespaces)
-            if value_elem:
-                allergy_data['allergen'] = value_elem[0].get('displayName', '')
+            value_elem = _first(entry, _TAG_VALUE)
+            if value_elem is not None:
+                allergy_data['allergen'] = value_elem.get('displayName', '')
             
             # Reaction
-            reaction_elem = entry.xpath(".//hl7:entryRelationship//hl7:value", namespaces=self.namespaces)
-            if reaction_elem:
-                allergy_data['reaction'] = reaction_elem[0].get('displayName', '')
+            reaction_elem = _first_within(entry, _TAG_ENTRY_RELATIONSHIP, _TAG_VALUE)
+            if reaction_elem is not None:
+                allergy_data['reaction'] = reaction_elem.get('displayName', '')
             
             # Severity
-            severity_elem = entry.xpath(".//hl7:entryRelationship[@typeCode='SUBJ']//hl7:value", namespaces=self.namespaces)
-            if severity_elem:
-                allergy_data['severity'] = severity_elem[0].get('displayName', '')
+            severity_elem = _first_within(entry, _TAG_ENTRY_RELATIONSHIP, _TAG_VALUE, type_code='SUBJ')
+            if severity_elem is not None:
+                allergy_data['severity'] = severity_elem.get('displayName', '')
             
             # Status
-            status_elem = entry.xpath(".//hl7:statusCode", namespaces=self.namespaces)
-            if status_elem:
-                allergy_data['status'] = status_elem[0].get('code', '')
+            status_elem = _first(entry, _TAG_STATUS_CODE)
+            if status_elem is not None:
+                allergy_data['status'] = status_elem.get('code', '')
             
             if allergy_data:
                 allergies.append(allergy_data)
         
-        logger.info(f"Parsed {len(allergies)} allergies")
         return allergies
     
     def parse_problems(self) -> List[Dict[str, Any]]:
         """Parse problems/diagnoses section."""
-        problems = []
         section = self.find_section_by_title("Problems")
         
         if section is None:
             logger.warning("Problems section not found")
-            return problems
+            return []
         
-        entries = section.xpath(".//hl7:observation", namespaces=self.namespaces)
+        return self._extract_problems(section)
+    
+    def _extract_problems(self, section) -> List[Dict[str, Any]]:
+        """Extract records from a Problems section element."""
+        problems = []
+        
+        entries = section.iterdescendants(_TAG_OBSERVATION)
         
         for entry in entries:
             problem_data = {}
             
             # Problem name
-            value_elem = entry.xpath(".//hl7:value", namespaces=self.namespaces)
-            if value_elem:
-                problem_data['problem_name'] = value_elem[0].get('displayName', '')
-                problem_data['icd10_code'] = value_elem[0].get('code', '')
+            value_elem = _first(entry, _TAG_VALUE)
+            if value_elem is not None:
+                problem_data['problem_name'] = value_elem.get('displayName', '')
+                problem_data['icd10_code'] = value_elem.get('code', '')
             
             # Onset date
-            effective_time = entry.xpath(".//hl7:effectiveTime//hl7:low", namespaces=self.namespaces)
-            if effective_time:
-                problem_data['onset_date'] = self.parse_date(effective_time[0].get('value'))
+            effective_time = _first_within(entry, _TAG_EFFECTIVE_TIME, _TAG_LOW)
+            if effective_time is not None:
+                problem_data['onset_date'] = self.parse_date(effective_time.get('value'))
             
             # Status
-            status_elem = entry.xpath(".//hl7:statusCode", namespaces=self.namespaces)
-            if status_elem:
-                problem_data['status'] = status_elem[0].get('code', '')
+            status_elem = _first(entry, _TAG_STATUS_CODE)
+            if status_elem is not None:
+                problem_data['status'] = status_elem.get('code', '')
             
             if problem_data:
                 problems.append(problem_data)
         
-        logger.info(f"Parsed {len(problems)} problems")
         return problems
     
     def parse_procedures(self) -> List[Dict[str, Any]]:
         """Parse procedures section."""
-        procedures = []
         section = self.find_section_by_title("Procedures")
         
         if section is None:
             logger.warning("Procedures section not found")
-            return procedures
+            return []
+        
+        return self._extract_procedures(section)
+    
+    def _extract_procedures(self, section) -> List[Dict[str, Any]]:
+        """Extract records from a Procedures section element."""
+        procedures = []
         
-        entries = section.xpath(".//hl7:procedure", namespaces=self.namespaces)
+        entries = section.iterdescendants(_TAG_PROCEDURE)
         
         for entry in entries:
             procedure_data = {}
             
             # Procedure name
-            code_elem = entry.xpath(".//hl7:code", namespaces=self.namespaces)
-            if code_elem:
-                procedure_data['procedure_name'] = code_elem[0].get('displayName', '')
-                procedure_data['cpt_code'] = code_elem[0].get('code', '')
+            code_elem = _first(entry, _TAG_CODE)
+            if code_elem is not None:
+                procedure_data['procedure_name'] = code_elem.get('displayName', '')
+                procedure_data['cpt_code'] = code_elem.get('code', '')
             
             # Procedure date
-            effective_time = entry.xpath(".//hl7:effectiveTime", namespaces=self.namespaces)
-            if effective_time:
-                procedure_data['procedure_date'] = self.parse_date(effective_time[0].get('value'))
+            effective_time = _first(entry, _TAG_EFFECTIVE_TIME)
+            if effective_time is not None:
+                procedure_data['procedure_date'] = self.parse_date(effective_time.get('value'))
             
             # Status
-            status_elem = entry.xpath(".//hl7:statusCode", namespaces=self.namespaces)
-            if status_elem:
-                procedure_data['status'] = status_elem[0].get('code', '')
+            status_elem = _first(entry, _TAG_STATUS_CODE)
+            if status_elem is not None:
+                procedure_data['status'] = status_elem.get('code', '')
             
             if procedure_data:
                 procedures.append(procedure_data)
         
-        logger.info(f"Parsed {len(procedures)} procedures")
         return procedures
     
     def parse_results(self) -> List[Dict[str, Any]]:
         """Parse lab results section."""
-        results = []
         section = self.find_section_by_title("Results")
         
         if section is None:
             logger.warning("Results section not found")
-            return results
+            return []
+        
+        return self._extract_results(section)
+    
+    def _extract_results(self, section) -> List[Dict[str, Any]]:
+        """Extract records from a Results section element."""
+        results = []
         
-        entries = section.xpath(".//hl7:observation", namespaces=self.namespaces)
+        entries = section.iterdescendants(_TAG_OBSERVATION)
         
         for entry in entries:
             result_data = {}
             
             # Test name
-            code_elem = entry.xpath(".//hl7:code", namespaces=self.namespaces)
-            if code_elem:
-                result_data['test_name'] = code_elem[0].get('displayName', '')
-                result_data['loinc_code'] = code_elem[0].get('code', '')
+            code_elem = _first(entry, _TAG_CODE)
+            if code_elem is not None:
+                result_data['test_name'] = code_elem.get('displayName', '')
+                result_data['loinc_code'] = code_elem.get('code', '')
             
             # Result value
-            value_elem = entry.xpath(".//hl7:value", namespaces=self.namespaces)
-            if value_elem:
-                result_data['result_value'] = value_elem[0].get('value', '')
-                result_data['unit'] = value_elem[0].get('unit', '')
+            value_elem = _first(entry, _TAG_VALUE)
+            if value_elem is not None:
+                result_data['result_value'] = value_elem.get('value', '')
+                result_data['unit'] = value_elem.get('unit', '')
             
             # Test date
-            effective_time = entry.xpath(".//hl7:effectiveTime", namespaces=self.namespaces)
-            if effective_time:
-                result_data['test_date'] = self.parse_date(effective_time[0].get('value'))
+            effective_time = _first(entry, _TAG_EFFECTIVE_TIME)
+            if effective_time is not None:
+                result_data['test_date'] = self.parse_date(effective_time.get('value'))
             
             # Reference range
-            ref_range_elem = entry.xpath(".//hl7:referenceRange//hl7:text", namespaces=self.namespaces)
-            if ref_range_elem:
-                result_data['reference_range'] = self.get_text_content(ref_range_elem[0])
+            ref_range_elem = _first_within(entry, _TAG_REFERENCE_RANGE, _TAG_TEXT)
+            if ref_range_elem is not None:
+                result_data['reference_range'] = self.get_text_content(ref_range_elem)
             
             if result_data:
                 results.append(result_data)
         
-        logger.info(f"Parsed {len(results)} lab results")
         return results
     
     def parse_vitals(self) -> List[Dict[str, Any]]:
         """Parse vitals section."""
-        vitals = []
         section = self.find_section_by_title("Vitals")
         
         if section is None:
             logger.warning("Vitals section not found")
-            return vitals
+            return []
+        
+        return self._extract_vitals(section)
+    
+    def _extract_vitals(self, section) -> List[Dict[str, Any]]:
+        """Extract records from a Vitals section element."""
+        vitals = []
         
-        entries = section.xpath(".//hl7:observation", namespaces=self.namespaces)
+        entries = section.iterdescendants(_TAG_OBSERVATION)
         
         for entry in entries:
             vital_data = {}
             
             # Measurement date
-            effective_time = entry.xpath(".//hl7:effectiveTime", namespaces=self.namespaces)
-            if effective_time:
-                vital_data['measurement_date'] = self.parse_date(effective_time[0].get('value'))
+            effective_time = _first(entry, _TAG_EFFECTIVE_TIME)
+            if effective_time is not None:
+                vital_data['measurement_date'] = self.parse_date(effective_time.get('value'))
             
             # Vital type and value
-            code_elem = entry.xpath(".//hl7:code", namespaces=self.namespaces)
-            value_elem = entry.xpath(".//hl7:value", namespaces=self.namespaces)
-            
-            if code_elem and value_elem:
-                vital_type = code_elem[0].get('displayName', '').lower()
-                vital_value = value_elem[0].get('value', '')
-                
-                if 'height' in vital_type:
-                    vital_data['height_cm'] = vital_value
-                elif 'weight' in vital_type:
-                    vital_data['weight_kg'] = vital_value
-                elif 'blood pressure' in vital_type or 'systolic' in vital_type:
-                    vital_data['systolic_bp'] = vital_value
-                elif 'diastolic' in vital_type:
-                    vital_data['diastolic_bp'] = vital_value
-                elif 'heart rate' in vital_type or 'pulse' in vital_type:
-                    vital_data['heart_rate'] = vital_value
-                elif 'temperature' in vital_type:
-                    vital_data['temperature_c'] = vital_value
+            code_elem = _first(entry, _TAG_CODE)
+            value_elem = _first(entry, _TAG_VALUE)
+            
+            if code_elem is not None and value_elem is not None:
+                # The LOINC code identifies the measurement exactly; display
+                # names are only matched when the code is missing or unknown
+                field = _VITAL_FIELDS_BY_LOINC.get(code_elem.get('code'))
+                if field is None:
+                    field = _vital_field_from_name(code_elem.get('displayName', ''))
+                if field is not None:
+                    vital_data[field] = value_elem.get('value', '')
             
             if vital_data:
                 vitals.append(vital_data)
         
-        logger.info(f"Parsed {len(vitals)} vital measurements")
         return vitals
     
     def parse_immunizations(self) -> List[Dict[str, Any]]:
         """Parse immunizations section."""
-        immunizations = []
         section = self.find_section_by_title("Immunizations")
         
         if section is None:
             logger.warning("Immunizations section not found")
-            return immunizations
+            return []
         
-        entries = section.xpath(".//hl7:substanceAdministration", namespaces=self.namespaces)
+        return self._extract_immunizations(section)
+    
+    def _extract_immunizations(self, section) -> List[Dict[str, Any]]:
+        """Extract records from a Immunizations section element."""
+        immunizations = []
+        
+        entries = section.iterdescendants(_TAG_SUBSTANCE_ADMINISTRATION)
         
         for entry in entries:
             imm_data = {}
             
             # Vaccine name
-            code_elem = entry.xpath(".//hl7:code", namespaces=self.namespaces)
-            if code_elem:
-                imm_data['vaccine_name'] = code_elem[0].get('displayName', '')
-                imm_data['cvx_code'] = code_elem[0].get('code', '')
+            code_elem = _first(entry, _TAG_CODE)
+            if code_elem is not None:
+                imm_data['vaccine_name'] = code_elem.get('displayName', '')
+                imm_data['cvx_code'] = code_elem.get('code', '')
             
             # Administration date
-            effective_time = entry.xpath(".//hl7:effectiveTime", namespaces=self.namespaces)
-            if effective_time:
-                imm_data['administration_date'] = self.parse_date(effective_time[0].get('value'))
+            effective_time = _first(entry, _TAG_EFFECTIVE_TIME)
+            if effective_time is not None:
+                imm_data['administration_date'] = self.parse_date(effective_time.get('value'))
             
             # Route
-            route_elem = entry.xpath(".//hl7:routeCode", namespaces=self.namespaces)
-            if route_elem:
-                imm_data['route'] = route_elem[0].get('displayName', '')
+            route_elem = _first(entry, _TAG_ROUTE_CODE)
+            if route_elem is not None:
+                imm_data['route'] = route_elem.get('displayName', '')
             
             if imm_data:
                 immunizations.append(imm_data)
         
-        logger.info(f"Parsed {len(immunizations)} immunizations")
         return immunizations
     
+    def stream(self) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        """Yield (section, record) pairs while reading the document incrementally.
+        
+        Each section is extracted as soon as its closing tag is read and
+        top-level sections are cleared afterwards, so memory is bounded by the
+        largest section rather than the whole document. As with
+        find_section_by_title, only the first section with a given title is used.
+        """
+        seen = set()
+        section_tag = _TAG_SECTION
+        
+        for _, section in etree.iterparse(self.xml_file_path, events=('end',), tag=section_tag,
+                                          **_PARSER_OPTIONS):
+            for title in _XP_TITLE_TEXT(section):
+                name = _SECTION_TITLES.get(title)
+                if name and name not in seen:
+                    seen.add(name)
+                    for record in getattr(self, f"_extract_{name}")(section):
+                        yield name, record
+                    break
+            
+            # Nested sections stay intact so an enclosing section can still be extracted
+            if next(section.iterancestors(section_tag), None) is None:
+                section.clear(keep_tail=True)
+        
+        for title, name in _SECTION_TITLES.items():
+            if name not in seen:
+                logger.warning(f"{title} section not found")
+    
     def parse_all_sections(self) -> Dict[str, List[Dict[str, Any]]]:
         """Parse all supported sections."""
-        return {
-            'medications': self.parse_medications(),
-            'allergies': self.parse_allergies(),
-            'problems': self.parse_problems(),
-            'procedures': self.parse_procedures(),
-            'results': self.parse_results(),
-            'vitals': self.parse_vitals(),
-            'immunizations': self.parse_immunizations()
-        }
\ No newline at end of file
+        if self.root is None:
+            parsed_data = {name: [] for name in SECTIONS}
+            for section, record in self.stream():
+                parsed_data[section].append(record)
+        else:
+            parsed_data = {
+                'medications': self.parse_medications(),
+                'allergies': self.parse_allergies(),
+                'problems': self.parse_problems(),
+                'procedures': self.parse_procedures(),
+                'results': self.parse_results(),
+                'vitals': self.parse_vitals(),
+                'immunizations': self.parse_immunizations()
+            }
+        
+        # One summary line per document rather than one per section
+        counts = ', '.join(f"{len(records)} {section}" for section, records in parsed_data.items())
+        logger.info(f"Parsed {counts}")
+        return parsed_data
\ No newline at end of file